@@ -0,0 +1,32 @@
+"""add sent tests partial indexes
+
+Revision ID: 9d3f6a1b2c47
+Revises: 4b7e2d91c3a5
+Create Date: 2026-10-18 10:20:41.207815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6a1b2c47'
+down_revision: Union[str, None] = '4b7e2d91c3a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_sent_tests_receiver_username_undelivered', 'sent_tests', ['receiver_username'], unique=False,
+                    postgresql_where=sa.text('is_delivered = false'))
+    op.create_index('ix_sent_tests_receiver_id_uncompleted', 'sent_tests', ['receiver_id'], unique=False,
+                    postgresql_where=sa.text('is_completed = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sent_tests_receiver_id_uncompleted', table_name='sent_tests',
+                  postgresql_where=sa.text('is_completed = false'))
+    op.drop_index('ix_sent_tests_receiver_username_undelivered', table_name='sent_tests',
+                  postgresql_where=sa.text('is_delivered = false'))
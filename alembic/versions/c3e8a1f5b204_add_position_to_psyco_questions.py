@@ -0,0 +1,31 @@
+"""add position to psyco questions and options
+
+Revision ID: c3e8a1f5b204
+Revises: 9f5a43d6f0fe
+Create Date: 2026-10-18 16:02:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5b204'
+down_revision: Union[str, None] = '9f5a43d6f0fe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('psyco_questions', sa.Column('position', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('psyco_question_answers', sa.Column('position', sa.Integer(), server_default='0', nullable=False))
+    # Rows of an imported package share one created_at, their order is only known to the package:
+    # forget the stored hashes, so the next seeding imports every package again with positions
+    op.execute("UPDATE psyco_tests SET package_hash = NULL WHERE package IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_column('psyco_question_answers', 'position')
+    op.drop_column('psyco_questions', 'position')
@@ -0,0 +1,48 @@
+# core/admin/admin_panel.py
+
+import os
+
+from sqladmin import Admin
+from sqladmin.authentication import login_required
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from core.admin.models.base import BaseAdminModel
+
+
+ADMIN_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+
+class AdminPanel(Admin):
+    """
+    SQLAdmin with detail pages that load child collections page by page (see BaseAdminModel.get_details).
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("templates_dir", ADMIN_TEMPLATES_DIR)
+        super().__init__(*args, **kwargs)
+
+    @login_required
+    async def details(self, request: Request) -> Response:
+        await self._details(request)
+
+        model_view = self._find_model_view(request.path_params["identity"])
+        if not isinstance(model_view, BaseAdminModel):
+            model = await model_view.get_object_for_details(request.path_params["pk"])
+            pages = []
+        else:
+            model, pages = await model_view.get_details(request.path_params["pk"], request)
+        if not model:
+            raise HTTPException(status_code=404)
+
+        context = {
+            "model_view": model_view,
+            "model": model,
+            "title": model_view.name,
+            "collection_pages": pages,
+        }
+
+        return await self.templates.TemplateResponse(
+            request, model_view.details_template, context
+        )
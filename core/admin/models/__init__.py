@@ -6,6 +6,7 @@ from .tg_user import TgUserAdmin
 from .movie_quiz import MovieQuizAdmin, MovieQuizQuestionAdmin, MovieQuizAnswerAdmin
 from .psyco_test import PsycoTestAdmin, PsycoResultAdmin, PsycoQuestionAdmin, PsycoQuestionAnswerAdmin, PsycoAnswerAdmin
 from .send_test import SendTestAdmin
+from .media_file import MediaFileAdmin
 
 
 # Register admin views
@@ -20,3 +21,4 @@ def setup_admin(admin):
     admin.add_view(PsycoQuestionAnswerAdmin)
     admin.add_view(PsycoAnswerAdmin)
     admin.add_view(SendTestAdmin)
+    admin.add_view(MediaFileAdmin)
@@ -4,14 +4,44 @@ from typing import Any
 
 from fastapi import UploadFile
 from sqladmin import ModelView, action
-from sqlalchemy import select
+from sqlalchemy import any_, bindparam, func, inspect as sa_inspect, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
 from core import logger
-from core.admin import async_sqladmin_db_helper
+from utils import FrozenSlots
+
+
+class DetailsPage(FrozenSlots):
+    """
+    One page of a child collection on a detail page.
+    """
+    __slots__ = ("name", "label", "number", "first", "last", "total", "prev_url", "next_url")
+
+    @classmethod
+    def build(cls, view: "BaseAdminModel", request: Request | None, name: str, number: int, total: int) -> "DetailsPage":
+        first = (number - 1) * view.details_page_size + 1
+        last = min(number * view.details_page_size, total)
+
+        def page_url(page: int) -> str | None:
+            if request is None:
+                return None
+            return str(request.url.include_query_params(**{f"{name}_page": page}))
+
+        return cls(
+            name=name,
+            label=view._column_labels.get(name, name),
+            number=number,
+            first=min(first, total),
+            last=last,
+            total=total,
+            prev_url=page_url(number - 1) if number > 1 else None,
+            next_url=page_url(number + 1) if last < total else None,
+        )
 
 
 class BaseAdminModel(ModelView):
@@ -35,38 +65,179 @@ class BaseAdminModel(ModelView):
         'id': {'readonly': True},
     }
 
+    # Relationship paths the "with children" actions of CascadeActionsMixin also (de)activate,
+    # e.g. ("questions", "questions.answer_options")
+    cascade_relationships: tuple[str, ...] = ()
+
+    # CustomFileSystemStorage used by _handle_file_upload
+    upload_storage = None
+
+    # Relationships loaded together with the object on the detail page. None means the many-to-one ones;
+    # collections not listed here are shown page by page, details_page_size rows at a time
+    details_eager_relationships: tuple[str, ...] | None = None
+    details_page_size = 20
+    details_template = "admin/details.html"
+    # Shows the affected row counts of the last activate/deactivate action (?action_result=...)
+    list_template = "admin/list.html"
+
     async def get_one(self, _id):
+        obj, _ = await self.get_details(_id)
+        return obj
+
+    def _details_eager_relation_names(self) -> list[str]:
+        if self.details_eager_relationships is not None:
+            return list(self.details_eager_relationships)
+        relationships = sa_inspect(self.model).relationships
+        return [name for name in self._details_relation_names if not relationships[name].uselist]
+
+    def _details_collection_names(self) -> list[str]:
+        relationships = sa_inspect(self.model).relationships
+        eager = self._details_eager_relation_names()
+        return [name for name in self._details_relation_names if relationships[name].uselist and name not in eager]
+
+    async def _load_collection_page(self, session: AsyncSession, obj: Any, name: str, number: int) -> tuple[list, int]:
+        relationship = sa_inspect(self.model).relationships[name]
+        (local_key, foreign_key), = relationship.local_remote_pairs
+        child = relationship.mapper.class_
+        parent_id = getattr(obj, local_key.key)
+
+        total = await session.scalar(select(func.count()).select_from(child).where(foreign_key == parent_id))
+        result = await session.execute(
+            select(child)
+            .where(foreign_key == parent_id)
+            .order_by(child.created_at, child.id)
+            .limit(self.details_page_size)
+            .offset((number - 1) * self.details_page_size)
+        )
+        return list(result.scalars().all()), total
+
+    async def get_details(self, value: Any, request: Request | None = None) -> tuple[Any, list[DetailsPage]]:
+        """
+        Loads the object of the detail page with the relationships of details_eager_relationships.
+        Collections are fetched one page at a time (?<relationship>_page=N), so the page stays fast
+        however many rows the related tables have.
+        """
+        stmt = self._stmt_by_identifier(value)
+        for name in self._details_eager_relation_names():
+            stmt = stmt.options(selectinload(getattr(self.model, name)))
+
+        pages = []
         async with self.session as session:
-            stmt = select(self.model).options(selectinload('*')).filter_by(id=_id)
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+            obj = (await session.execute(stmt)).scalars().first()
+            if obj is None:
+                return None, pages
+
+            for name in self._details_collection_names():
+                number = 1
+                if request is not None:
+                    try:
+                        number = max(int(request.query_params.get(f"{name}_page", 1)), 1)
+                    except ValueError:
+                        pass
+                items, total = await self._load_collection_page(session, obj, name, number)
+                # Replaces the lazy collection without marking the object as changed
+                set_committed_value(obj, name, items)
+                pages.append(DetailsPage.build(self, request, name, number, total))
+        return obj, pages
+
+    async def get_object_for_details(self, value: Any) -> Any:
+        obj, _ = await self.get_details(value)
+        return obj
 
     async def get_form(self, form_class, obj: Any = None):
         return await super().get_form(form_class, obj)
 
-    async def _handle_file_upload(self, field_name: str, file: UploadFile):
-        if isinstance(file, UploadFile):
-            content = await file.read()
-        else:
+    async def _handle_file_upload(self, field_name: str, file: UploadFile) -> str:
+        """
+        Streams the upload into upload_storage and returns the stored name.
+        """
+        if not isinstance(file, UploadFile):
             raise ValueError(f"Unsupported file type for {field_name}")
-        return content
+        if self.upload_storage is None:
+            raise ValueError(f"{self.name} does not accept file uploads")
+        return await self.upload_storage.put(file)
 
     async def _update_model_fields(self, session: AsyncSession, model: Any, data: dict):
         for key, value in data.items():
             if hasattr(model, key):
                 setattr(model, key, value)
 
-    async def _process_action(self, request: Request, is_active: bool) -> None:
-        pks = request.query_params.get("pks", "").split(",")
-        if pks:
-            async with self.session as session:
-                async with session.begin():
-                    for pk in pks:
-                        model = await session.get(self.model, pk)
-                        if model:
-                            model.is_active = is_active
-                    await session.commit()
-                logger.info(f"Successfully {'activated' if is_active else 'deactivated'} {len(pks)} {self.name}(s)")
+    def invalidate_caches(self) -> None:
+        """
+        Drops in-process caches built from this model. Called after every change made through the admin panel.
+        """
+
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        self.invalidate_caches()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        self.invalidate_caches()
+
+    def _selected_pks(self, request: Request) -> list:
+        pk_type = self.model.id.type.python_type
+        pks = []
+        for raw_pk in request.query_params.get("pks", "").split(","):
+            try:
+                pks.append(pk_type(raw_pk))
+            except ValueError:
+                continue
+        return pks
+
+    def _activation_statements(self, pks: list, is_active: bool, cascade: bool) -> list[tuple[str, Any]]:
+        """
+        One set-based UPDATE for the selected rows and, with cascade, one per path in cascade_relationships.
+        Children are selected through the relationship foreign keys, so every statement is a single round trip.
+        Rows that already have the requested state are not touched.
+        """
+        table = self.model.__table__
+        selected = table.c.id == any_(bindparam("pks", pks, type_=ARRAY(table.c.id.type)))
+        statements = [(self.name, update(table).where(selected, table.c.is_active != is_active).values(is_active=is_active))]
+        if not cascade:
+            return statements
+
+        for path in self.cascade_relationships:
+            parent_ids = select(table.c.id).where(selected)
+            model = self.model
+            for name in path.split("."):
+                relationship = sa_inspect(model).relationships[name]
+                (_, foreign_key), = relationship.local_remote_pairs
+                child = relationship.mapper.local_table
+                stmt = update(child).where(foreign_key.in_(parent_ids), child.c.is_active != is_active)
+                parent_ids = select(child.c.id).where(foreign_key.in_(parent_ids))
+                model = relationship.mapper.class_
+            statements.append((path, stmt.values(is_active=is_active)))
+        return statements
+
+    async def _process_action(self, request: Request, is_active: bool, cascade: bool = False) -> dict[str, int]:
+        pks = self._selected_pks(request)
+        if not pks:
+            return {}
+
+        counts = {}
+        async with self.session as session:
+            async with session.begin():
+                for name, stmt in self._activation_statements(pks, is_active, cascade):
+                    result = await session.execute(stmt)
+                    counts[name] = result.rowcount
+        logger.info(f"{self._action_summary(is_active, counts)} for {len(pks)} selected {self.name}(s)")
+        self.invalidate_caches()
+        return counts
+
+    @staticmethod
+    def _action_summary(is_active: bool, counts: dict[str, int]) -> str:
+        return f"{'Activated' if is_active else 'Deactivated'} rows: " + ", ".join(
+            f"{name}={count}" for name, count in counts.items()
+        )
+
+    async def _run_action(self, request: Request, is_active: bool, cascade: bool = False) -> RedirectResponse:
+        """
+        Runs the action and returns to the list, which reports how many rows every statement changed.
+        """
+        counts = await self._process_action(request, is_active, cascade)
+        url = request.url_for("admin:list", identity=self.identity)
+        if counts:
+            url = url.include_query_params(action_result=self._action_summary(is_active, counts))
+        return RedirectResponse(url, status_code=302)
 
     @action(
         name="activate",
@@ -76,8 +247,7 @@ class BaseAdminModel(ModelView):
         add_in_list=True,
     )
     async def activate(self, request: Request) -> RedirectResponse:
-        await self._process_action(request, True)
-        return RedirectResponse(request.url_for("admin:list", identity=self.identity), status_code=302)
+        return await self._run_action(request, True)
 
     @action(
         name="deactivate",
@@ -87,9 +257,35 @@ class BaseAdminModel(ModelView):
         add_in_list=True,
     )
     async def deactivate(self, request: Request) -> RedirectResponse:
-        await self._process_action(request, False)
-        return RedirectResponse(request.url_for("admin:list", identity=self.identity), status_code=302)
+        return await self._run_action(request, False)
 
     @property
     def session(self):
-        return AsyncSession(async_sqladmin_db_helper.engine)
+        # Sessions of the admin pool, the same factory the Admin instance hands to every view
+        return self.session_maker()
+
+
+class CascadeActionsMixin:
+    """
+    Adds actions that (de)activate the selected rows together with everything in cascade_relationships.
+    """
+
+    @action(
+        name="activate_cascade",
+        label="Activate with children",
+        confirmation_message="Are you sure you want to activate selected %(model)s and everything they contain?",
+        add_in_detail=True,
+        add_in_list=True,
+    )
+    async def activate_cascade(self, request: Request) -> RedirectResponse:
+        return await self._run_action(request, True, cascade=True)
+
+    @action(
+        name="deactivate_cascade",
+        label="Deactivate with children",
+        confirmation_message="Are you sure you want to deactivate selected %(model)s and everything they contain?",
+        add_in_detail=True,
+        add_in_list=True,
+    )
+    async def deactivate_cascade(self, request: Request) -> RedirectResponse:
+        return await self._run_action(request, False, cascade=True)
@@ -0,0 +1,27 @@
+# core/admin/models/media_file.py
+
+from sqlalchemy import select
+
+from .base import BaseAdminModel
+from core.models import MediaFile
+
+
+class MediaFileAdmin(BaseAdminModel, model=MediaFile):
+    column_list = [
+        "name", "original_filename", "width", "height", "size",
+        "telegram_width", "telegram_height", "telegram_size", "thumbnail_size", "created_at",
+    ]
+    column_searchable_list = ["name", "original_filename", "sha256"]
+    column_sortable_list = ["size", "telegram_size", "width", "height", "created_at"]
+    column_filters = ["storage"]
+
+    # Rows are written by the upload pipeline
+    can_create = False
+    can_edit = False
+
+    category = "Media"
+    icon = "fa-solid fa-image"
+
+    async def scaffold_list_query(self):
+        query = select(self.model).order_by(self.model.created_at.desc())
+        return query
@@ -5,48 +5,58 @@ from typing import Any
 from fastapi import UploadFile
 from sqlalchemy import select
 
-from .base import BaseAdminModel 
+from .base import BaseAdminModel, CascadeActionsMixin
 from core.models import (
     PsycoTest, PsycoQuestion, PsycoAnswer, 
     PsycoQuestionAnswer, PsycoResult
     )
-from services import psyco_test_storage
+from services import psyco_test_storage, psyco_test_catalog
 
 
-class PsycoTestAdmin(BaseAdminModel, model=PsycoTest):
-    column_list = ["id", "name", "description", "allow_back", "is_active", "picture", "created_at", "updated_at"]
-    column_details_exclude_list = ["questions", "results"]
-    form_excluded_columns = ["questions", "results", "created_at", "updated_at"]
+class PsycoTestCatalogAdmin(BaseAdminModel):
+    """
+    Base view for every model that is compiled into the psyco test catalog.
+    """
+
+    def invalidate_caches(self) -> None:
+        psyco_test_catalog.invalidate()
+
+
+class PsycoTestAdmin(CascadeActionsMixin, PsycoTestCatalogAdmin, model=PsycoTest):
+    column_list = ["id", "name", "description", "allow_back", "is_active", "picture", "package", "created_at", "updated_at"]
+    # Packages are owned by the test importer
+    form_excluded_columns = ["questions", "results", "package", "package_hash", "created_at", "updated_at"]
     column_searchable_list = ["name", "description", "allow_back"]
     column_sortable_list = ["name", "allow_back", "created_at", "updated_at"]
 
     category = "Psychological Tests"
+    upload_storage = psyco_test_storage
+    cascade_relationships = ("questions", "questions.answer_options")
 
     async def on_model_change(self, data: dict, model: Any, is_created: bool, session: Any) -> None:  # TODO: Add mechanics to delete old image file from the storage when new image is uploaded
         if "picture" in data and isinstance(data["picture"], UploadFile):
-            filename = await psyco_test_storage.put(data["picture"])
-            model.picture = filename
+            model.picture = await self._handle_file_upload("picture", data["picture"])
 
     async def scaffold_list_query(self):
         query = select(self.model).order_by(self.model.created_at.desc())
         return query
 
 
-class PsycoQuestionAdmin(BaseAdminModel, model=PsycoQuestion):
-    column_list = ["id", "test", "question_text", "is_active", "created_at", "updated_at"]
-    column_details_exclude_list = ["answer_options"]
+class PsycoQuestionAdmin(CascadeActionsMixin, PsycoTestCatalogAdmin, model=PsycoQuestion):
+    column_list = ["id", "test", "position", "question_text", "is_active", "created_at", "updated_at"]
     form_excluded_columns = ["answer_options", "created_at", "updated_at"]
     column_searchable_list = ["question_text"]
-    column_sortable_list = ["created_at", "updated_at"]
+    column_sortable_list = ["position", "created_at", "updated_at"]
 
     category = "Psychological Tests"
+    cascade_relationships = ("answer_options",)
 
     async def scaffold_list_query(self):
         query = select(self.model).order_by(self.model.created_at.desc())
         return query
 
 
-class PsycoAnswerAdmin(BaseAdminModel, model=PsycoAnswer):
+class PsycoAnswerAdmin(PsycoTestCatalogAdmin, model=PsycoAnswer):
     column_list = ["id", "answer_text", "is_active", "created_at", "updated_at"]
     column_searchable_list = ["answer_text"]
     column_sortable_list = ["created_at", "updated_at"]
@@ -59,10 +69,10 @@ class PsycoAnswerAdmin(BaseAdminModel, model=PsycoAnswer):
         return query
 
 
-class PsycoQuestionAnswerAdmin(BaseAdminModel, model=PsycoQuestionAnswer):
-    column_list = ["id", "question", "answer", "score_value", "is_active", "created_at", "updated_at"]
+class PsycoQuestionAnswerAdmin(PsycoTestCatalogAdmin, model=PsycoQuestionAnswer):
+    column_list = ["id", "question", "answer", "position", "score_value", "is_active", "created_at", "updated_at"]
     column_searchable_list = ["question.question_text", "answer.answer_text"]
-    column_sortable_list = ["created_at", "updated_at", "score_value"]
+    column_sortable_list = ["position", "created_at", "updated_at", "score_value"]
     form_excluded_columns = ["created_at", "updated_at"]
 
     category = "Psychological Tests"
@@ -72,7 +82,7 @@ class PsycoQuestionAnswerAdmin(BaseAdminModel, model=PsycoQuestionAnswer):
         return query
 
 
-class PsycoResultAdmin(BaseAdminModel, model=PsycoResult):
+class PsycoResultAdmin(PsycoTestCatalogAdmin, model=PsycoResult):
     column_list = ["id", "test", "min_score", "max_score", "text", "is_active", "created_at", "updated_at"]
     column_searchable_list = ["text"]
     column_sortable_list = ["min_score", "max_score", "created_at", "updated_at"]
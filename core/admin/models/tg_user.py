@@ -1,5 +1,6 @@
 from core.admin.models.base import BaseAdminModel
 from core.models.tg_user import TGUser
+from services import UserService
 
 
 class TgUserAdmin(BaseAdminModel, model=TGUser):
@@ -14,3 +15,6 @@ class TgUserAdmin(BaseAdminModel, model=TGUser):
     name = "Telegram User"
     name_plural = "Telegram Users"
     category = "Telegram"
+
+    def invalidate_caches(self) -> None:
+        UserService.invalidate_cache()
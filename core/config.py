@@ -1,8 +1,9 @@
 # core/config.py
 
+import hashlib
 import os
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from pydantic.networks import PostgresDsn
 
 from dotenv import load_dotenv
@@ -18,6 +19,14 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
 
 POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", 10))
 POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", 20))
+POSTGRES_ADMIN_POOL_SIZE = int(os.getenv("POSTGRES_ADMIN_POOL_SIZE", 3))
+POSTGRES_ADMIN_MAX_OVERFLOW = int(os.getenv("POSTGRES_ADMIN_MAX_OVERFLOW", 2))
+POSTGRES_BACKGROUND_POOL_SIZE = int(os.getenv("POSTGRES_BACKGROUND_POOL_SIZE", 3))
+POSTGRES_BACKGROUND_MAX_OVERFLOW = int(os.getenv("POSTGRES_BACKGROUND_MAX_OVERFLOW", 2))
+POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", 30 * 60))
+POSTGRES_POOL_PRE_PING = os.getenv("POSTGRES_POOL_PRE_PING", "True").lower() in ('true', '1')
+# Connections one worker may open over all pools, 0 disables the check
+POSTGRES_MAX_CONNECTIONS = int(os.getenv("POSTGRES_MAX_CONNECTIONS", 0))
 
 POSTGRES_ECHO = os.getenv("POSTGRES_ECHO", "True").lower() in ('true', '1')
 
@@ -25,6 +34,7 @@ POSTGRES_ECHO = os.getenv("POSTGRES_ECHO", "True").lower() in ('true', '1')
 DEBUG = os.getenv("DEBUG", "True").lower() in ('true', '1')
 APP_RUN_HOST = str(os.getenv("APP_RUN_HOST", "0.0.0.0"))
 APP_RUN_PORT = int(os.getenv("APP_RUN_PORT", 8000))
+APP_RUN_WORKERS = int(os.getenv("APP_RUN_WORKERS", 1))
 
 # SQLAdmin ENV variables
 SQLADMIN_SECRET_KEY = os.getenv("SQLADMIN_SECRET_KEY", "sqladmin_secret_key")
@@ -34,19 +44,76 @@ SQLADMIN_PASSWORD = os.getenv("SQLADMIN_PASSWORD", "password")
 # Bot ENV variables
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 BOT_WELCOME_MESSAGE = os.getenv("BOT_WELCOME_MESSAGE", "Hello, {username}, I'm your Psyco-Bot!")
+BOT_UPDATE_MODE = os.getenv("BOT_UPDATE_MODE", "polling")
+BOT_WEBHOOK_BASE_URL = os.getenv("BOT_WEBHOOK_BASE_URL", "")
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "/bot/webhook")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+
+# FSM storage ENV variables
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", "fsm_storage.sqlite3")
+FSM_DEFAULT_TTL = int(os.getenv("FSM_DEFAULT_TTL", 24 * 60 * 60))
+
+# Users ENV variables
+USERS_UPSERT_BATCH_DELAY_MS = int(os.getenv("USERS_UPSERT_BATCH_DELAY_MS", 0))
+USERS_CACHE_SIZE = int(os.getenv("USERS_CACHE_SIZE", 10000))
+USERS_CACHE_TTL = int(os.getenv("USERS_CACHE_TTL", 60))
+
+# Movie quiz ENV variables
+MOVIE_QUIZ_QUESTIONS_PER_SESSION = int(os.getenv("MOVIE_QUIZ_QUESTIONS_PER_SESSION", 10))
+MOVIE_QUIZ_QUESTION_CACHE_SIZE = int(os.getenv("MOVIE_QUIZ_QUESTION_CACHE_SIZE", 5000))
+
+# Startup ENV variables
+STARTUP_SEED_TEST_PACKAGES = os.getenv("STARTUP_SEED_TEST_PACKAGES", "True").lower() in ('true', '1')
+STARTUP_WARM_UP_POOLS = os.getenv("STARTUP_WARM_UP_POOLS", "True").lower() in ('true', '1')
+STARTUP_PHASE_TIMEOUT = float(os.getenv("STARTUP_PHASE_TIMEOUT", 60))
 
 # CORS ENV variables
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", ["*"])
 
 MEDIA_FILES_ALLOWED_EXTENSIONS = os.getenv("MEDIA_FILES_ALLOWED_EXTENSIONS",
                                            ['.jpg', '.jpeg', '.png'])
+MEDIA_MAX_UPLOAD_SIZE = int(os.getenv("MEDIA_MAX_UPLOAD_SIZE", 20 * 1024 * 1024))
+
+
+class PoolConfig(BaseModel):
+    pool_size: int
+    max_overflow: int
+    # Seconds to wait for a free connection before failing
+    pool_timeout: float = 30.0
+    pool_recycle: int = POSTGRES_POOL_RECYCLE
+    pool_pre_ping: bool = POSTGRES_POOL_PRE_PING
+    # Log every statement of this pool
+    echo: bool = POSTGRES_ECHO
+
+    @field_validator('pool_size', 'pool_timeout')
+    def validate_positive(cls, v):
+        if v <= 0:
+            raise ValueError("Must be positive")
+        return v
+
+    @field_validator('max_overflow')
+    def validate_non_negative_int(cls, v):
+        if v < 0:
+            raise ValueError("Must be a non-negative integer")
+        return v
+
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + self.max_overflow
 
 
 class DBConfig(BaseModel):
     url: PostgresDsn = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_ADDRESS}:5432/{POSTGRES_DB}"
-    pool_size: int = POSTGRES_POOL_SIZE
-    max_overflow: int = POSTGRES_MAX_OVERFLOW
-    echo: bool = POSTGRES_ECHO
+    max_connections: int = POSTGRES_MAX_CONNECTIONS
+
+    # Separate pools, so admin traffic and background jobs can not take the connections bot updates need
+    pools: dict[str, PoolConfig] = {
+        "bot": PoolConfig(pool_size=POSTGRES_POOL_SIZE, max_overflow=POSTGRES_MAX_OVERFLOW),
+        "admin": PoolConfig(pool_size=POSTGRES_ADMIN_POOL_SIZE, max_overflow=POSTGRES_ADMIN_MAX_OVERFLOW, pool_timeout=10.0, echo=False),
+        "background": PoolConfig(pool_size=POSTGRES_BACKGROUND_POOL_SIZE, max_overflow=POSTGRES_BACKGROUND_MAX_OVERFLOW),
+    }
 
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
@@ -56,17 +123,43 @@ class DBConfig(BaseModel):
         "pk": "pk_%(table_name)s"
     }
 
-    @field_validator('pool_size', 'max_overflow')
-    def validate_positive_int(cls, v):
-        if v <= 0:
-            raise ValueError("Must be a positive integer")
+    @field_validator('max_connections')
+    def validate_non_negative_int(cls, v):
+        if v < 0:
+            raise ValueError("Must be a non-negative integer")
         return v
 
+    @model_validator(mode='after')
+    def validate_pools(self):
+        missing = {"bot", "admin", "background"} - self.pools.keys()
+        if missing:
+            raise ValueError(f"Missing database pools: {', '.join(sorted(missing))}")
+        total = sum(pool.max_connections for pool in self.pools.values())
+        if self.max_connections and total > self.max_connections:
+            raise ValueError(f"Database pools may open {total} connections, the limit is {self.max_connections}")
+        return self
+
 
 class RunConfig(BaseModel):
     debug: bool = DEBUG
     host: str = APP_RUN_HOST
     port: int = APP_RUN_PORT
+    # More than one worker needs webhook mode, a shared FSM storage and DEBUG=False (uvicorn ignores workers with reload)
+    workers: int = APP_RUN_WORKERS
+
+
+class StartupConfig(BaseModel):
+    # Import changed packages from psyco_tests_data on every start
+    seed_test_packages: bool = STARTUP_SEED_TEST_PACKAGES
+    # Open pool_size connections of every pool before updates are accepted
+    warm_up_pools: bool = STARTUP_WARM_UP_POOLS
+    phase_timeout: float = STARTUP_PHASE_TIMEOUT
+
+    @field_validator('phase_timeout')
+    def validate_positive(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive number")
+        return v
 
 
 class SQLAdminConfig(BaseModel):
@@ -83,6 +176,142 @@ class BotConfig(BaseModel):
         "подробной информацией: когда и после какого действия произошла ошибка.")
     confirming_words: list[str] = ["да", "yes", "конечно", "отправить", "send", "accept", "absolutely"]
 
+    update_mode: str = BOT_UPDATE_MODE  # polling | webhook
+    webhook_base_url: str = BOT_WEBHOOK_BASE_URL
+    webhook_path: str = BOT_WEBHOOK_PATH
+    webhook_secret: str = BOT_WEBHOOK_SECRET
+
+    @field_validator('update_mode')
+    def validate_update_mode(cls, v):
+        if v not in ('polling', 'webhook'):
+            raise ValueError("Update mode must be one of: polling, webhook")
+        return v
+
+    @model_validator(mode='after')
+    def validate_webhook(self):
+        # Telegram only delivers updates to a public HTTPS URL
+        if self.update_mode == 'webhook' and not self.webhook_base_url.startswith('https://'):
+            raise ValueError("Webhook mode needs BOT_WEBHOOK_BASE_URL, the public https:// address of the app")
+        if not self.webhook_path.startswith('/'):
+            raise ValueError("Webhook path must start with a slash")
+        return self
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{self.webhook_base_url.rstrip('/')}{self.webhook_path}"
+
+    @property
+    def webhook_secret_token(self) -> str:
+        # Telegram allows only [A-Za-z0-9_-] here; the derived value is the same in every worker
+        return self.webhook_secret or hashlib.sha256((self.token or "").encode()).hexdigest()
+
+
+class BroadcastConfig(BaseModel):
+    workers: int = 20
+    # Telegram allows about 30 messages per second overall and about 1 per second in a single chat
+    global_rate: float = 25.0
+    per_chat_rate: float = 1.0
+    per_chat_burst: int = 3
+    max_attempts: int = 3
+    batch_size: int = 500
+    progress_interval: float = 10.0
+    flush_interval: float = 2.0
+    # A running job whose heartbeat is older than this is considered crashed and gets resumed
+    stale_after: int = 60
+
+    @field_validator('workers', 'max_attempts', 'batch_size', 'per_chat_burst', 'stale_after')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+
+class UsersConfig(BaseModel):
+    # 0 writes every /start right away, otherwise /start upserts are collected and written as one statement
+    upsert_batch_delay_ms: int = USERS_UPSERT_BATCH_DELAY_MS
+    upsert_batch_size: int = 500
+    # Users kept in memory while the database is unavailable, the oldest are dropped beyond that
+    upsert_max_pending: int = 10000
+    # Profiles are cached per process, edits made in another worker are seen after the TTL
+    cache_size: int = USERS_CACHE_SIZE
+    cache_ttl: int = USERS_CACHE_TTL
+
+    @field_validator('upsert_batch_delay_ms')
+    def validate_non_negative_int(cls, v):
+        if v < 0:
+            raise ValueError("Must be a non-negative integer")
+        return v
+
+    @field_validator('upsert_batch_size', 'upsert_max_pending', 'cache_size', 'cache_ttl')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+
+class ResultsConfig(BaseModel):
+    # Completed test runs are buffered and written with one multi-row insert per interval
+    flush_interval: float = 1.0
+    batch_size: int = 500
+    # Runs kept in memory while the database is unavailable, the oldest are dropped beyond that
+    max_pending: int = 10000
+
+    @field_validator('batch_size', 'max_pending')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+
+class MovieQuizConfig(BaseModel):
+    # Questions drawn at random for one run, 0 asks every question of the quiz
+    questions_per_session: int = MOVIE_QUIZ_QUESTIONS_PER_SESSION
+    # Questions with their answers are compiled on first use and kept for all quizzes together
+    question_cache_size: int = MOVIE_QUIZ_QUESTION_CACHE_SIZE
+    question_cache_ttl: int = 60 * 60
+
+    @field_validator('questions_per_session')
+    def validate_non_negative_int(cls, v):
+        if v < 0:
+            raise ValueError("Must be a non-negative integer")
+        return v
+
+    @field_validator('question_cache_size', 'question_cache_ttl')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+
+class FSMConfig(BaseModel):
+    storage: str = FSM_STORAGE  # memory | redis | sqlite
+    redis_url: str = FSM_REDIS_URL
+    sqlite_path: str = FSM_SQLITE_PATH
+    default_ttl: int = FSM_DEFAULT_TTL
+    # Seconds an abandoned conversation may stay in a state, by full state name
+    state_ttls: dict[str, int] = {
+        "PsycoTestState:choosing_test": 60 * 60,
+        "PsycoTestState:confirming_test": 60 * 60,
+        "QuizState:choosing_quiz": 60 * 60,
+        "AdminBroadcastStates:WAITING_FOR_MESSAGE": 6 * 60 * 60,
+        "AdminBroadcastStates:WAITING_FOR_CONFIRMATION": 60 * 60,
+        "SendTestStates:WAITING_FOR_USERNAME": 30 * 60,
+        "SendTestStates:WAITING_FOR_TEST": 30 * 60,
+        "SendTestStates:CONFIRMING": 30 * 60,
+    }
+
+    @field_validator('storage')
+    def validate_storage(cls, v):
+        if v not in ('memory', 'redis', 'sqlite'):
+            raise ValueError("Storage must be one of: memory, redis, sqlite")
+        return v
+
+    @field_validator('default_ttl')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
 
 class CORSConfig(BaseModel):
     allowed_origins: list = ALLOWED_ORIGINS
@@ -94,6 +323,13 @@ class MediaConfig(BaseModel):
     movie_quiz_path: str = "media/movie_quiz"
     allowed_image_extensions: list[str] = list(MEDIA_FILES_ALLOWED_EXTENSIONS)
     psyco_test_path: str = "media/psyco_tests"
+    # Uploads are streamed to disk in chunks and rejected above this size (bytes)
+    max_upload_size: int = MEDIA_MAX_UPLOAD_SIZE
+    upload_chunk_size: int = 64 * 1024
+    # Variants generated for every uploaded picture
+    telegram_max_side: int = 1280
+    thumbnail_max_side: int = 320
+    jpeg_quality: int = 85
 
     @field_validator('movie_quiz_path')
     def validate_path(cls, v):
@@ -110,11 +346,31 @@ class MediaConfig(BaseModel):
 
 class Settings(BaseSettings):
     run: RunConfig = RunConfig()
+    startup: StartupConfig = StartupConfig()
     admin_panel: SQLAdminConfig = SQLAdminConfig()
     db: DBConfig = DBConfig()
     bot: BotConfig = BotConfig()
+    fsm: FSMConfig = FSMConfig()
+    users: UsersConfig = UsersConfig()
+    results: ResultsConfig = ResultsConfig()
+    movie_quiz: MovieQuizConfig = MovieQuizConfig()
+    broadcast: BroadcastConfig = BroadcastConfig()
     cors: CORSConfig = CORSConfig()
     media: MediaConfig = MediaConfig()
 
+    @model_validator(mode='after')
+    def validate_workers(self):
+        if self.run.workers > 1:
+            problems = []
+            if self.run.debug:
+                problems.append("DEBUG=False (uvicorn ignores workers with reload)")
+            if self.bot.update_mode != 'webhook':
+                problems.append("BOT_UPDATE_MODE=webhook (workers polling together conflict on getUpdates)")
+            if self.fsm.storage == 'memory':
+                problems.append("a shared FSM_STORAGE (every worker would keep its own conversations in memory)")
+            if problems:
+                raise ValueError(f"APP_RUN_WORKERS={self.run.workers} needs " + ", ".join(problems))
+        return self
+
 
 settings = Settings()
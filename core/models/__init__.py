@@ -1,5 +1,8 @@
 __all__ = [
     "db_helper",
+    "admin_db_helper",
+    "background_db_helper",
+    "engine_registry",
     "TGUser",
     "MovieQuiz",
     "MovieQuizQuestion",
@@ -10,12 +13,21 @@ __all__ = [
     "PsycoQuestionAnswer",
     "PsycoAnswer",
     "SentTest",
+    "PsycoTestResult",
+    "TelegramFile",
+    "MediaFile",
+    "BroadcastJob",
+    "BroadcastDelivery",
     ]
 
-from .db_helper import db_helper
+from .db_helper import db_helper, admin_db_helper, background_db_helper, engine_registry
 from .tg_user import TGUser
 from .movie_quiz import MovieQuiz, MovieQuizQuestion, MovieQuizAnswer
 from .psyco_test import (
     PsycoTest, PsycoResult, PsycoQuestion, PsycoQuestionAnswer, PsycoAnswer
     )
 from .send_test import SentTest
+from .psyco_test_result import PsycoTestResult
+from .telegram_file import TelegramFile
+from .media_file import MediaFile
+from .broadcast import BroadcastJob, BroadcastDelivery
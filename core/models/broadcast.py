@@ -0,0 +1,69 @@
+# core/models/broadcast.py
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class BroadcastJob(Base):
+    """
+    A mass mailing started by a superuser. Survives restarts, the unfinished recipients are in BroadcastDelivery.
+    """
+    __tablename__ = "broadcast_jobs"
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+    created_by: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # Broadcast messages as JSON dumps of the original aiogram messages
+    messages: Mapped[list] = mapped_column(JSONB, nullable=False)
+
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=PENDING)
+    total_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sent_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Updated by the running worker, a stale heartbeat means the job has to be resumed
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __str__(self):
+        return f"BroadcastJob(id={self.id}, status={self.status}, sent={self.sent_count}/{self.total_count})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BroadcastDelivery(Base):
+    """
+    Delivery status of one broadcast job for one recipient.
+    """
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        UniqueConstraint("job_id", "chat_id"),
+        Index("ix_broadcast_deliveries_job_id_status_chat_id", "job_id", "status", "chat_id"),
+    )
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    job_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=PENDING)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __str__(self):
+        return f"BroadcastDelivery(job_id={self.job_id}, chat_id={self.chat_id}, status={self.status})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -5,15 +5,22 @@ from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import (create_async_engine, AsyncEngine,
                                     async_sessionmaker, AsyncSession)
 from core import logger, settings
+from core.config import PoolConfig
 
 
 class DataBaseHelper:
-    def __init__(self, url: str, echo: bool, pool_size: int, max_overflow: int):
+    def __init__(self, name: str, url: str, pool: PoolConfig):
+        self.name = name
+        self.pool_config = pool
         self.engine: AsyncEngine = create_async_engine(
             url=url,
-            echo=echo,
-            pool_size=pool_size,
-            max_overflow=max_overflow,
+            echo=pool.echo,
+            pool_size=pool.pool_size,
+            max_overflow=pool.max_overflow,
+            pool_timeout=pool.pool_timeout,
+            pool_recycle=pool.pool_recycle,
+            pool_pre_ping=pool.pool_pre_ping,
+            connect_args={"server_settings": {"application_name": f"psyco_tests:{name}"}},
         )
         self.session_factory: async_sessionmaker[AsyncSession] = async_sessionmaker(
             bind=self.engine,
@@ -25,6 +32,16 @@ class DataBaseHelper:
     async def dispose(self) -> None:
         await self.engine.dispose()
 
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_connections": self.pool_config.max_connections,
+        }
+
     async def session_getter(self) -> AsyncSession:  # type: ignore # TODO: This is for FastAPI Depends, not very comfortable with anything else
         async with self.session_factory() as session:
             yield session
@@ -43,9 +60,48 @@ class DataBaseHelper:
                 await session.close()
 
 
-db_helper = DataBaseHelper(
-    url=settings.db.url,
-    echo=settings.db.echo,
-    pool_size=settings.db.pool_size,
-    max_overflow=settings.db.max_overflow,
+class EngineRegistry:
+    """
+    One engine per named pool, all against the same database:
+
+        bot         bot handlers and catalogs
+        admin       SQLAdmin views
+        background  broadcasts and write-behind buffers
+
+    Each pool has its own size limit, so neither the admin panel nor a long broadcast can take
+    the connections bot updates need, and the connections of one worker never exceed the sum of the limits.
+    """
+
+    def __init__(self, url: str, pools: dict[str, PoolConfig]):
+        self._helpers = {name: DataBaseHelper(name, url, pool) for name, pool in pools.items()}
+        logger.info(
+            "Database pools: " + ", ".join(f"{name}={pool.max_connections}" for name, pool in pools.items())
+            + f", at most {self.max_connections} connections"
+        )
+
+    def __getitem__(self, name: str) -> DataBaseHelper:
+        return self._helpers[name]
+
+    def __iter__(self):
+        return iter(self._helpers.values())
+
+    @property
+    def max_connections(self) -> int:
+        return sum(helper.pool_config.max_connections for helper in self)
+
+    def stats(self) -> dict[str, dict]:
+        return {helper.name: helper.stats() for helper in self}
+
+    async def dispose(self) -> None:
+        for helper in self:
+            await helper.dispose()
+
+
+engine_registry = EngineRegistry(
+    url=str(settings.db.url),
+    pools=settings.db.pools,
 )
+
+db_helper = engine_registry["bot"]
+admin_db_helper = engine_registry["admin"]
+background_db_helper = engine_registry["background"]
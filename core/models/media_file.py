@@ -0,0 +1,39 @@
+# core/models/media_file.py
+
+from sqlalchemy import BigInteger, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class MediaFile(Base):
+    """
+    Picture uploaded through the admin panel. Files are stored under the sha256 of their content,
+    so the same picture uploaded twice is stored once. Next to the original there is a re-encoded
+    JPEG that is sent to Telegram and a small thumbnail.
+    """
+    __tablename__ = "media_files"
+    __table_args__ = (
+        UniqueConstraint("storage", "name"),
+    )
+
+    # Root folder of the storage the file belongs to
+    storage: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    original_filename: Mapped[str] = mapped_column(String, nullable=True)
+
+    width: Mapped[int] = mapped_column(Integer, nullable=False)
+    height: Mapped[int] = mapped_column(Integer, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    telegram_name: Mapped[str] = mapped_column(String, nullable=False)
+    telegram_width: Mapped[int] = mapped_column(Integer, nullable=False)
+    telegram_height: Mapped[int] = mapped_column(Integer, nullable=False)
+    telegram_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    thumbnail_name: Mapped[str] = mapped_column(String, nullable=False)
+    thumbnail_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<MediaFile(name={self.name}, {self.width}x{self.height}, size={self.size})>"
@@ -35,7 +35,15 @@ class PsycoTest(Base):
 
     allow_back: Mapped[bool] = mapped_column(Boolean, default=True)
 
-    questions: Mapped[List["PsycoQuestion"]] = relationship(back_populates="test", cascade="all, delete-orphan")
+    # Name of the package in psyco_tests_data the test is imported from (None for tests made in the admin panel)
+    # and the hash of its content at the last import
+    package: Mapped[Optional[str]] = mapped_column(String, nullable=True, unique=True)
+    package_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    questions: Mapped[List["PsycoQuestion"]] = relationship(
+        back_populates="test", cascade="all, delete-orphan",
+        order_by=lambda: (PsycoQuestion.position, PsycoQuestion.created_at),
+    )
     results: Mapped[List["PsycoResult"]] = relationship(back_populates="test", cascade="all, delete-orphan")
 
     def __repr__(self):
@@ -52,9 +60,14 @@ class PsycoQuestion(Base):
 
     question_text: Mapped[str] = mapped_column(String, nullable=False)
     test_id: Mapped[int] = mapped_column(ForeignKey("psyco_tests.id"))
+    # Order of the question in its test, questions with the same position go in creation order
+    position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     test: Mapped[PsycoTest] = relationship(back_populates="questions")
-    answer_options: Mapped[List["PsycoQuestionAnswer"]] = relationship(back_populates="question", cascade="all, delete-orphan")
+    answer_options: Mapped[List["PsycoQuestionAnswer"]] = relationship(
+        back_populates="question", cascade="all, delete-orphan",
+        order_by=lambda: (PsycoQuestionAnswer.position, PsycoQuestionAnswer.created_at),
+    )
 
     def __repr__(self):
         return f"<PsycoQuestion(id={self.id}, question_text={self.question_text})>"
@@ -72,6 +85,8 @@ class PsycoQuestionAnswer(Base):
     answer_id: Mapped[int] = mapped_column(ForeignKey("psyco_answers.id"))
     # is_correct: Mapped[Optional[bool]] = mapped_column(Boolean)
     score_value: Mapped[Optional[int]] = mapped_column(Integer)
+    # Order of the option under its question
+    position: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     question: Mapped[PsycoQuestion] = relationship(back_populates="answer_options")
     answer: Mapped[PsycoAnswer] = relationship()
@@ -0,0 +1,31 @@
+# core/models/psyco_test_result.py
+
+import uuid
+
+from sqlalchemy import BigInteger, ForeignKey, Integer, SmallInteger, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class PsycoTestResult(Base):
+    """
+    A completed psyco test run. Answers are stored as the chosen option index for every question,
+    in the question order of the compiled test version the run was made with.
+    """
+    __tablename__ = "test_results"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+
+    # Results outlive the tests, a deleted test only clears the reference
+    test_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("psyco_tests.id", ondelete="SET NULL"), nullable=True, index=True)
+    test_version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sent_test_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("sent_tests.id", ondelete="SET NULL"), nullable=True)
+
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    answers: Mapped[list[int]] = mapped_column(ARRAY(SmallInteger), nullable=False)
+    result_text: Mapped[str] = mapped_column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"<PsycoTestResult(id={self.id}, chat_id={self.chat_id}, test_id={self.test_id}, score={self.score})>"
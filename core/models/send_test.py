@@ -21,7 +21,7 @@ was send information is kept.
 # 3. Обновить обработчик команды /start для проверки наличия неотвеченных тестов и тестов из листа ожидания
 # 4. Добавить уведомления для отправителей тестов
 
-from sqlalchemy import Column, ForeignKey, Boolean, DateTime, String, BigInteger
+from sqlalchemy import Column, ForeignKey, Boolean, DateTime, String, BigInteger, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from core.models.base import Base
@@ -29,6 +29,13 @@ from core.models.base import Base
 
 class SentTest(Base):
     __tablename__ = "sent_tests"
+    __table_args__ = (
+        # Partial indexes for the /start lookups: tests waiting for a username and unfinished tests of a chat
+        Index("ix_sent_tests_receiver_username_undelivered", "receiver_username",
+              postgresql_where=text("is_delivered = false")),
+        Index("ix_sent_tests_receiver_id_uncompleted", "receiver_id",
+              postgresql_where=text("is_completed = false")),
+    )
 
     # sender_id = Column(UUID(as_uuid=True), ForeignKey("tg_users.id"), nullable=False)
     # sender = relationship("TGUser", foreign_keys=[sender_id])
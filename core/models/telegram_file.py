@@ -0,0 +1,29 @@
+# core/models/telegram_file.py
+
+from sqlalchemy import BigInteger, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class TelegramFile(Base):
+    """
+    file_id Telegram assigned to a stored media file after its first upload by the bot.
+    Size and mtime identify the file version, a replaced file is uploaded again.
+    """
+    __tablename__ = "telegram_files"
+    __table_args__ = (
+        UniqueConstraint("bot_id", "path"),
+    )
+
+    # file_id values are only valid for the bot that received them
+    bot_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    path: Mapped[str] = mapped_column(String, nullable=False)
+
+    file_id: Mapped[str] = mapped_column(String, nullable=False)
+    file_unique_id: Mapped[str] = mapped_column(String, nullable=True)
+    file_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    file_mtime_ns: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<TelegramFile(path={self.path}, file_id={self.file_id})>"
@@ -1,93 +1,106 @@
 # handlers/movie_quiz.py
 
 import random
-from aiogram import Router, types
+from aiogram import F, Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select  # TODO: Use active() instead of select
-from sqlalchemy.orm import selectinload
 
-from core.models import db_helper
-from core.models.movie_quiz import MovieQuiz, MovieQuizQuestion
 from core import logger, settings
+from services import movie_quiz_catalog, MovieQuizSession, answer_photo, message_renderer
 
 
 router = Router()
 
+QUIZZES_PER_PAGE = 8
+QUIZ_DESCRIPTION_LIMIT = 150
+
 
 class QuizState(StatesGroup):
     choosing_quiz = State()
     answering_questions = State()
 
 
+def build_quiz_page(quizzes, page: int) -> tuple[str, types.InlineKeyboardMarkup]:
+    pages = (len(quizzes) + QUIZZES_PER_PAGE - 1) // QUIZZES_PER_PAGE
+    page = min(max(page, 0), pages - 1)
+    shown = quizzes[page * QUIZZES_PER_PAGE:(page + 1) * QUIZZES_PER_PAGE]
+
+    lines = [f"Please choose a quiz (page {page + 1}/{pages}):"]
+    for number, quiz in enumerate(shown, start=page * QUIZZES_PER_PAGE + 1):
+        description = quiz.description or ""
+        if len(description) > QUIZ_DESCRIPTION_LIMIT:
+            description = description[:QUIZ_DESCRIPTION_LIMIT].rstrip() + "…"
+        lines.append(f"\n{number}. {quiz.title}" + (f"\n{description}" if description else ""))
+
+    keyboard = [
+        [types.InlineKeyboardButton(text=quiz.title, callback_data=f"quiz:{quiz.id}")]
+        for quiz in shown
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(types.InlineKeyboardButton(text="⬅️ Previous", callback_data=f"quiz_page:{page - 1}"))
+    if page < pages - 1:
+        navigation.append(types.InlineKeyboardButton(text="Next ➡️", callback_data=f"quiz_page:{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    return "\n".join(lines), types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 @router.message(Command("start_quiz"))
 async def start_quiz(message: types.Message, state: FSMContext):
-    async for session in db_helper.session_getter():
-        try: 
-            quizzes = await session.execute(select(MovieQuiz))  # TODO: Use active() instead of select
-            quizzes = quizzes.scalars().all()
-        except Exception as e:
-            logger.exception(f"Error in get_all_quizzes: {e}")
-            await message.answer("An error occurred while fetching quizzes. Please try again later.")
-            return
-        finally:
-            await session.close()
+    quizzes = await movie_quiz_catalog.listing()
+    if quizzes is None:
+        await message.answer("An error occurred while fetching quizzes. Please try again later.")
+        return
 
     if not quizzes:
         await message.answer("No quizzes available at the moment.")
         return
 
-    for quiz in quizzes:
-        keyboard = types.InlineKeyboardMarkup(
-            inline_keyboard=[[types.InlineKeyboardButton(text="Start this quiz", callback_data=f"quiz:{quiz.id}")]]
-        )
-        
-        quiz_text = f"{quiz.title}\n\n{quiz.description}" if quiz.description else quiz.title
-        
-        if quiz.picture:
-            image_url = f"{settings.media.base_url}/{quiz.picture}"
-            await message.answer_photo(photo=image_url, caption=quiz_text, reply_markup=keyboard)
-        else:
-            await message.answer(quiz_text, reply_markup=keyboard)
-
+    text, keyboard = build_quiz_page(quizzes, 0)
+    await message_renderer.send(message, text, reply_markup=keyboard)
     await state.set_state(QuizState.choosing_quiz)
 
-@router.callback_query(QuizState.choosing_quiz)
+@router.callback_query(QuizState.choosing_quiz, F.data.startswith("quiz_page:"))
+async def change_quiz_page(callback_query: types.CallbackQuery, state: FSMContext):
+    quizzes = await movie_quiz_catalog.listing()
+    if not quizzes:
+        await callback_query.answer("No quizzes available at the moment.")
+        return
+
+    try:
+        page = int(callback_query.data.split(':')[1])
+    except ValueError:
+        page = 0
+
+    text, keyboard = build_quiz_page(quizzes, page)
+    await message_renderer.show(callback_query.message, text, reply_markup=keyboard)
+    await callback_query.answer()
+
+@router.callback_query(QuizState.choosing_quiz, F.data.startswith("quiz:"))
 async def process_quiz_choice(callback_query: types.CallbackQuery, state: FSMContext):
     quiz_id = callback_query.data.split(':')[1]
-    
-    async def fetch_quiz():
-        async for session in db_helper.session_getter():
-            try:
-                stmt = select(MovieQuiz).options(  # TODO: Use active() instead of select
-                    selectinload(MovieQuiz.questions).selectinload(MovieQuizQuestion.answers)
-                ).where(MovieQuiz.id == quiz_id)
-                result = await session.execute(stmt)
-                return result.scalar_one_or_none()
-            except Exception as e:
-                logger.exception(f"Error in get_quiz_by_id: {e}")
-                return None
-            finally:
-                await session.close()
 
     try:
-        quiz = await fetch_quiz()
+        quiz = await movie_quiz_catalog.get(quiz_id)
 
         if not quiz:
             await callback_query.answer("Quiz not found.")
             return
 
-        questions = quiz.questions
-        if not questions:
+        if not quiz.question_ids:
             await callback_query.message.answer("This quiz has no questions.")
             await state.clear()
             return
 
-        questions_list = list(questions)  # Convert to list to allow shuffling
-        random.shuffle(questions_list)
-        
-        await state.update_data(quiz_id=quiz_id, questions=questions_list, current_question=0, correct_answers=0)
+        session = MovieQuizSession.start(quiz, settings.movie_quiz.questions_per_session)
+        logger.info(
+            f"User {callback_query.from_user.id} started quiz {quiz.id}: "
+            f"{session.count} of {len(quiz.question_ids)} questions, seed {session.seed}"
+        )
+        await session.save(state)
         await send_next_question(callback_query.message, state)
         await callback_query.answer()
 
@@ -96,31 +109,51 @@ async def process_quiz_choice(callback_query: types.CallbackQuery, state: FSMCon
         await callback_query.message.answer("An error occurred while starting the quiz. Please try again later.")
         await state.clear()
 
+async def load_quiz_session(message: types.Message, state: FSMContext):
+    session = await MovieQuizSession.load(state)
+    quiz = await session.get_quiz() if session else None
+
+    if not quiz:
+        await message.answer("This quiz has been changed or is no longer available. Please start it again.")
+        await state.clear()
+        return None, None
+
+    return session, quiz
+
+async def load_current_question(message: types.Message, state: FSMContext, session: MovieQuizSession, quiz):
+    question = await movie_quiz_catalog.get_question(quiz, session.question_id(quiz))
+    if not question:
+        await message.answer("This quiz has been changed or is no longer available. Please start it again.")
+        await state.clear()
+    return question
+
 async def send_next_question(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    questions = data['questions']
-    current_question = data['current_question']
+    session, quiz = await load_quiz_session(message, state)
+    if not quiz:
+        return
 
-    if current_question >= len(questions):
+    if session.finished:
         await end_quiz(message, state)
         return
 
-    question = questions[current_question]
-    answers = question.answers
+    question = await load_current_question(message, state, session, quiz)
+    if not question:
+        return
+
+    answers = list(question.answers)
     random.shuffle(answers)
 
     keyboard = types.InlineKeyboardMarkup(
         inline_keyboard=[
-            [types.InlineKeyboardButton(text=answer.answer_text, callback_data=f"answer:{answer.id}")]
+            [types.InlineKeyboardButton(text=answer.text, callback_data=f"answer:{answer.id}")]
             for answer in answers
         ]
     )
 
     if question.picture:
-        image_url = f"{settings.media.base_url}/{question.picture}"
-        await message.answer_photo(photo=image_url, caption=question.question_text, reply_markup=keyboard)
+        await answer_photo(message, question.picture, question.text, reply_markup=keyboard)
     else:
-        await message.answer(question.question_text, reply_markup=keyboard)
+        await message.answer(question.text, reply_markup=keyboard)
 
     await state.set_state(QuizState.answering_questions)
 
@@ -128,10 +161,15 @@ async def send_next_question(message: types.Message, state: FSMContext):
 async def process_answer(callback_query: types.CallbackQuery, state: FSMContext):
     answer_id = callback_query.data.split(':')[1]
     
-    data = await state.get_data()
-    questions = data['questions']
-    current_question = data['current_question']
-    question = questions[current_question]
+    session, quiz = await load_quiz_session(callback_query.message, state)
+    if not quiz:
+        await callback_query.answer()
+        return
+
+    question = await load_current_question(callback_query.message, state, session, quiz)
+    if not question:
+        await callback_query.answer()
+        return
     
     answer = next((a for a in question.answers if str(a.id) == answer_id), None)
     
@@ -140,11 +178,11 @@ async def process_answer(callback_query: types.CallbackQuery, state: FSMContext)
         return
 
     if answer.is_correct:
-        data['correct_answers'] += 1
+        session.correct_answers += 1
     
     result_text = (
-        f"Your answer: {answer.answer_text}\n"
-        f"Correct answer: {next(a.answer_text for a in question.answers if a.is_correct)}\n"
+        f"Your answer: {answer.text}\n"
+        f"Correct answer: {question.correct_answer.text if question.correct_answer else '-'}\n"
         f"{'Correct!' if answer.is_correct else 'Incorrect.'}"
     )
     
@@ -156,22 +194,22 @@ async def process_answer(callback_query: types.CallbackQuery, state: FSMContext)
     if question.interesting_fact:
         await callback_query.message.answer(f"Interesting fact: {question.interesting_fact}")
 
-    data['current_question'] += 1
-    await state.update_data(data)
+    session.position += 1
+    await session.save(state)
     
     await send_next_question(callback_query.message, state)
     await callback_query.answer()
 
 async def end_quiz(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    correct_answers = data['correct_answers']
-    total_questions = len(data['questions'])
+    session = await MovieQuizSession.load(state)
+    correct_answers = session.correct_answers
+    total_questions = session.count
 
     await message.answer(
         f"Quiz completed!\n"
         f"You answered {correct_answers} out of {total_questions} questions correctly."
     )
 
-    logger.info(f"User {message.from_user.id} completed quiz {data['quiz_id']} with score {correct_answers}/{total_questions}")
+    logger.info(f"User {message.from_user.id} completed quiz {session.quiz_id} with score {correct_answers}/{total_questions}")
 
     await state.clear()
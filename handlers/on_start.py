@@ -4,12 +4,11 @@ from aiogram import F, types, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import CommandStart
-from sqlalchemy import func, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, select, union_all, update
 
-from core.models.psyco_test import PsycoQuestion, PsycoQuestionAnswer, PsycoTest
+from core.models.psyco_test import PsycoTest
 from core.models.send_test import SentTest
-from services import UserService
+from services import UserService, psyco_test_catalog, PsycoTestSession, apply_answer, revert_answer, chosen_options, psyco_result_writer, message_renderer
 from core import settings, logger
 from core.models import db_helper
 
@@ -35,35 +34,40 @@ class PsycoTestState(StatesGroup):
 
 
 async def get_unfinished_tests_keyboard(chat_id: int, username: str):
+    sent_tests = SentTest.__table__
+
+    # Tests sent to the username before the user started the bot are delivered to this chat now
+    claimed = (
+        update(sent_tests)
+        .where(sent_tests.c.receiver_username == username, sent_tests.c.is_delivered == False)
+        .values(receiver_id=chat_id, is_delivered=True, delivered_at=func.now())
+        .returning(sent_tests.c.id, sent_tests.c.test_id, sent_tests.c.is_completed, sent_tests.c.created_at)
+        .cte("claimed")
+    )
+    # The rest of the statement sees sent_tests as it was before the update, so claimed rows are added explicitly
+    unfinished = union_all(
+        select(claimed.c.id, claimed.c.test_id, claimed.c.created_at).where(claimed.c.is_completed == False),
+        select(sent_tests.c.id, sent_tests.c.test_id, sent_tests.c.created_at).where(
+            sent_tests.c.receiver_id == chat_id,
+            sent_tests.c.is_completed == False,
+            sent_tests.c.id.not_in(select(claimed.c.id)),
+        ),
+    ).subquery()
+
     async with db_helper.session_factory() as session:
-        waiting_tests = await session.execute(
-            select(SentTest).where(
-                SentTest.receiver_username == username,
-                SentTest.is_delivered == False
-            )
+        result = await session.execute(
+            select(unfinished.c.id, PsycoTest.name)
+            .join(PsycoTest, PsycoTest.id == unfinished.c.test_id)
+            .order_by(unfinished.c.created_at)
         )
-        waiting_tests = waiting_tests.scalars().all()
-        
-        for test in waiting_tests:
-            test.receiver_id = chat_id
-            test.is_delivered = True
-            test.delivered_at = func.now()
-        
-        unfinished_tests = await session.execute(
-            select(SentTest).where(
-                SentTest.receiver_id == chat_id,
-                SentTest.is_completed == False
-            ).options(selectinload(SentTest.test))
-        )
-        unfinished_tests = unfinished_tests.scalars().all()
-        
+        unfinished_tests = result.all()
         await session.commit()
 
     if unfinished_tests:
         logger.info(f"User {username} has {len(unfinished_tests)} unfinished tests")
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text=f"Пройти тест: {sent_test.test.name}", callback_data=f"start_sent_test:{sent_test.id}")]
-            for sent_test in unfinished_tests
+            [types.InlineKeyboardButton(text=f"Пройти тест: {test_name}", callback_data=f"start_sent_test:{sent_test_id}")]
+            for sent_test_id, test_name in unfinished_tests
         ])
         return keyboard, f"У вас есть {len(unfinished_tests)} непройденных тестов. Хотите пройти их сейчас?"
     else:
@@ -78,15 +82,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
 
     logger.info(f"Start command received from user {username} (chat_id: {chat_id})")
 
-    user_service = UserService()
-
-    user = await user_service.get_user(chat_id)
-    if not user:
-        user = await user_service.create_user(chat_id, username)
-        logger.info(f"Created new user: {chat_id}, username: {username}")
-    elif user.username != username:
-        await user_service.update_username(chat_id, username)
-        logger.info(f"Updated username for user {chat_id} to {username}")
+    await UserService.register_user(chat_id, username)
 
     keyboard, reply_text = await get_unfinished_tests_keyboard(chat_id, username)
 
@@ -109,15 +105,12 @@ async def start_sent_test(callback_query: types.CallbackQuery, state: FSMContext
     async with db_helper.session_factory() as session:
         sent_test = await session.get(SentTest, sent_test_id)
         if sent_test and not sent_test.is_completed:
-            test = await session.get(PsycoTest, sent_test.test_id, options=[
-                selectinload(PsycoTest.questions).selectinload(PsycoQuestion.answer_options).selectinload(PsycoQuestionAnswer.answer),
-                selectinload(PsycoTest.results)
-            ])
+            test = await psyco_test_catalog.get(sent_test.test_id)
             if not test:
                 await callback_query.message.edit_text("Тест не найден.")
                 return
             
-            await state.update_data(test=test, current_question_index=0, score=0, answers=[], current_sent_test_id=sent_test_id)
+            await PsycoTestSession(test.id, test.version, sent_test_id=sent_test_id).save(state)
             
             description_text = f"Вы выбрали тест: {test.name}\n\n{test.description}\n\nВы готовы начать?"
             keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -125,10 +118,9 @@ async def start_sent_test(callback_query: types.CallbackQuery, state: FSMContext
             ])
             
             if test.picture:
-                image_url = f"{settings.media.base_url}/{test.picture}"
-                await callback_query.message.answer_photo(photo=image_url, caption=description_text, reply_markup=keyboard)
+                await message_renderer.send(callback_query.message, description_text, test.picture, reply_markup=keyboard)
             else:
-                await callback_query.message.edit_text(text=description_text, reply_markup=keyboard)
+                await message_renderer.show(callback_query.message, description_text, reply_markup=keyboard)
             
             await state.set_state(PsycoTestState.confirming_test)
             
@@ -144,22 +136,35 @@ async def confirm_start_test(callback_query: types.CallbackQuery, state: FSMCont
     await send_next_question(callback_query.message, state)
     await callback_query.answer()
 
+async def load_test_session(message: types.Message, state: FSMContext):
+    session = await PsycoTestSession.load(state)
+    test = await session.get_test() if session else None
+
+    if not test:
+        await message.answer("Этот тест был изменен или больше недоступен. Пожалуйста, начните его заново.")
+        await state.clear()
+        return None, None
+
+    return session, test
+
+
 async def send_next_question(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    test = data['test']
-    current_question_index = data['current_question_index']
+    session, test = await load_test_session(message, state)
+    if not test:
+        return
+
+    current_question_index = session.index
 
     if current_question_index >= len(test.questions):
         await end_test(message, state)
         return
 
     current_question = test.questions[current_question_index]
-    answer_options = current_question.answer_options
 
     keyboard = types.InlineKeyboardMarkup(
         inline_keyboard=[
-            [types.InlineKeyboardButton(text=option.answer.answer_text, callback_data=f"answer:{option.id}")]
-            for option in answer_options
+            [types.InlineKeyboardButton(text=option.text, callback_data=f"answer:{option.id}")]
+            for option in current_question.options
         ]
     )
 
@@ -167,37 +172,26 @@ async def send_next_question(message: types.Message, state: FSMContext):
         keyboard.inline_keyboard.append([types.InlineKeyboardButton(text="⬅️ Back", callback_data="back_question")])
 
     test_progress = f"Вопрос {current_question_index + 1}/{len(test.questions)}\n\n"
-    question_text = test_progress + current_question.question_text
+    question_text = test_progress + current_question.text
 
     try:
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.edit_media(
-                media=types.InputMediaPhoto(media=image_url, caption=question_text),
-                reply_markup=keyboard
-            )
-        else:
-            await message.edit_text(text=question_text, reply_markup=keyboard)
+        await message_renderer.show(message, question_text, test.picture, reply_markup=keyboard)
     except Exception as e:
         logger.error(f"Error sending question: {e}")
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.answer_photo(photo=image_url, caption=question_text, reply_markup=keyboard)
-        else:
-            await message.answer(text=question_text, reply_markup=keyboard)
+        await message_renderer.send(message, question_text, test.picture, reply_markup=keyboard)
 
     await state.set_state(PsycoTestState.answering_questions)
 
 
 @router.callback_query(PsycoTestState.answering_questions, F.data == "back_question")
 async def go_back_question(callback_query: types.CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    current_question_index = data['current_question_index']
-    
-    if current_question_index > 0:
-        data['current_question_index'] -= 1
-        data['score'] -= data['answers'].pop().score_value
-        await state.set_data(data)
+    session, test = await load_test_session(callback_query.message, state)
+    if not test:
+        await callback_query.answer()
+        return
+
+    if revert_answer(session, test):
+        await session.save(state)
         await send_next_question(callback_query.message, state)
     
     await callback_query.answer()
@@ -207,38 +201,34 @@ async def go_back_question(callback_query: types.CallbackQuery, state: FSMContex
 async def process_answer(callback_query: types.CallbackQuery, state: FSMContext):
     answer_id = callback_query.data.split(':')[1]
     
-    data = await state.get_data()
-    test = data['test']
-    current_question_index = data['current_question_index']
-    current_question = test.questions[current_question_index]
-    
-    answer_option = next((a for a in current_question.answer_options if str(a.id) == answer_id), None)
-    
-    if not answer_option:
-        await callback_query.answer("Ответ не найден.")
+    session, test = await load_test_session(callback_query.message, state)
+    if not test:
+        await callback_query.answer()
         return
 
-    score = data['score']
-    score += answer_option.score_value
-
-    answers = data['answers']
-    answers.append(answer_option)
+    if not apply_answer(session, test, answer_id):
+        await callback_query.answer("Ответ не найден.")
+        return
 
-    await state.update_data(score=score, answers=answers, current_question_index=current_question_index + 1)
+    await session.save(state)
     
     await send_next_question(callback_query.message, state)
     await callback_query.answer()
 
 
 async def end_test(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    test = data['test']
-    score = data['score']
-    answers = data['answers']
-    current_sent_test_id = data.get('current_sent_test_id')
+    session, test = await load_test_session(message, state)
+    if not test:
+        return
+
+    score = session.score
+    answers = chosen_options(session, test)
+    current_sent_test_id = session.sent_test_id
+
+    result = test.results.find(score)
+    # Saved in the background, even if the score has no interpretation
+    psyco_result_writer.record(message.chat.id, session, test, result)
 
-    result = next((r for r in test.results if r.min_score <= score <= r.max_score), None)
-    
     if not result:
         await message.edit_text("Невозможно интерпретировать ваши результаты. Пожалуйста, свяжитесь с администратором.")
         await state.clear()
@@ -246,26 +236,17 @@ async def end_test(message: types.Message, state: FSMContext):
 
     result_text = (
         f"Тест завершен!\n\n"
-        f"Ваши ответы:\n" + "\n".join(f"{i+1}. {answer.answer.answer_text}" for i, answer in enumerate(answers)) + "\n\n"
+        f"Ваши ответы:\n" + "\n".join(f"{i+1}. {answer.text}" for i, answer in enumerate(answers)) + "\n\n"
         f"Ваш результат: {score}\n\n"
         f"Интерпретация:\n{result.text}"
     )
 
+    result_message = message
     try:
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.edit_media(
-                media=types.InputMediaPhoto(media=image_url, caption=result_text)
-            )
-        else:
-            await message.edit_text(result_text)
+        await message_renderer.show(message, result_text, test.picture)
     except Exception as e:
         logger.error(f"Error sending result: {e}")
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.answer_photo(photo=image_url, caption=result_text)
-        else:
-            await message.answer(result_text)
+        result_message = await message_renderer.send(message, result_text, test.picture)
 
     # Обновление статуса отправленного теста
     if current_sent_test_id:
@@ -287,20 +268,6 @@ async def end_test(message: types.Message, state: FSMContext):
     
     if keyboard:
         result_text += f"\n\n{reply_text}"
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.edit_media(
-                media=types.InputMediaPhoto(media=image_url, caption=result_text),
-                reply_markup=keyboard
-            )
-        else:
-            await message.edit_text(text=result_text, reply_markup=keyboard)
     else:
         result_text += "\n\nСпасибо, вы прошли все отправленные вам тесты! Можете посмотреть доступные тесты, используя команду /start_psyco_test"
-        if test.picture:
-            image_url = f"{settings.media.base_url}/{test.picture}"
-            await message.edit_media(
-                media=types.InputMediaPhoto(media=image_url, caption=result_text)
-            )
-        else:
-            await message.edit_text(result_text)
\ No newline at end of file
+    await message_renderer.show(result_message, result_text, test.picture, reply_markup=keyboard)
\ No newline at end of file
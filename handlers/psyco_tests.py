@@ -5,11 +5,11 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import func, select
-from sqlalchemy.orm import selectinload
 
 from core.models import db_helper
-from core.models import PsycoTest, PsycoQuestion, PsycoQuestionAnswer, SentTest
-from core import logger, settings
+from core.models import PsycoTest, SentTest
+from core import logger
+from services import psyco_test_catalog, PsycoTestSession, apply_answer, revert_answer, chosen_options, psyco_result_writer, message_renderer
 
 
 router = Router()
@@ -49,20 +49,7 @@ async def start_psyco_test(message: types.Message, state: FSMContext):
 @router.callback_query(PsycoTestState.choosing_test)
 async def confirm_test_choice(callback_query: types.CallbackQuery, state: FSMContext):
     test_id = callback_query.data.split(':')[1]
-    
-    async def fetch_test():
-        async for session in db_helper.session_getter():
-            try:
-                stmt = select(PsycoTest).where(PsycoTest.id == test_id)
-                result = await session.execute(stmt)
-                return result.scalar_one_or_none()
-            except Exception as e:
-                logger.exception(f"Error in get_psyco_test_by_id: {e}")
-                return None
-            finally:
-                await session.close()
-
-    test = await fetch_test()
+    test = await psyco_test_catalog.get(test_id)
 
     if not test:
         await callback_query.answer("Test not found.")
@@ -76,10 +63,9 @@ async def confirm_test_choice(callback_query: types.CallbackQuery, state: FSMCon
     description_text = f"You've selected: {test.name}\n\n{test.description}\n\nAre you ready to start the test?"
 
     if test.picture:
-        image_url = f"{settings.media.base_url}/{test.picture}"
-        await callback_query.message.answer_photo(photo=image_url, caption=description_text, reply_markup=keyboard)
+        await message_renderer.send(callback_query.message, description_text, test.picture, reply_markup=keyboard)
     else:
-        await callback_query.message.edit_text(text=description_text, reply_markup=keyboard)
+        await message_renderer.show(callback_query.message, description_text, reply_markup=keyboard)
 
     await state.set_state(PsycoTestState.confirming_test)
     await callback_query.answer()
@@ -92,48 +78,44 @@ async def back_to_test_selection(callback_query: types.CallbackQuery, state: FSM
 @router.callback_query(PsycoTestState.confirming_test, lambda c: c.data.startswith("start_test:"))
 async def start_test(callback_query: types.CallbackQuery, state: FSMContext):
     test_id = callback_query.data.split(':')[1]
-    
-    async def fetch_test():
-        async for session in db_helper.session_getter():
-            try:
-                stmt = select(PsycoTest).options(
-                    selectinload(PsycoTest.questions).selectinload(PsycoQuestion.answer_options).selectinload(PsycoQuestionAnswer.answer),
-                    selectinload(PsycoTest.results)
-                ).where(PsycoTest.id == test_id)
-                result = await session.execute(stmt)
-                return result.scalar_one_or_none()
-            except Exception as e:
-                logger.exception(f"Error in get_psyco_test_by_id: {e}")
-                return None
-            finally:
-                await session.close()
-
-    test = await fetch_test()
+    test = await psyco_test_catalog.get(test_id)
 
     if not test:
         await callback_query.answer("Test not found.")
         return
 
-    await state.update_data(test=test, current_question_index=0, score=0, answers=[])
+    await PsycoTestSession(test.id, test.version).save(state)
     await send_next_question(callback_query.message, state)
     await callback_query.answer()
 
+async def load_test_session(message: types.Message, state: FSMContext):
+    session = await PsycoTestSession.load(state)
+    test = await session.get_test() if session else None
+
+    if not test:
+        await message.answer("This test has been changed or is no longer available. Please start it again.")
+        await state.clear()
+        return None, None
+
+    return session, test
+
 async def send_next_question(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    test = data['test']
-    current_question_index = data['current_question_index']
+    session, test = await load_test_session(message, state)
+    if not test:
+        return
+
+    current_question_index = session.index
 
     if current_question_index >= len(test.questions):
         await end_test(message, state)
         return
 
     current_question = test.questions[current_question_index]
-    answer_options = current_question.answer_options
 
     keyboard = types.InlineKeyboardMarkup(
         inline_keyboard=[
-            [types.InlineKeyboardButton(text=option.answer.answer_text, callback_data=f"answer:{option.id}")]
-            for option in answer_options
+            [types.InlineKeyboardButton(text=option.text, callback_data=f"answer:{option.id}")]
+            for option in current_question.options
         ]
     )
 
@@ -141,28 +123,21 @@ async def send_next_question(message: types.Message, state: FSMContext):
         keyboard.inline_keyboard.append([types.InlineKeyboardButton(text="⬅️ Back", callback_data="back_question")])
 
     test_progress = f"Question {current_question_index + 1}/{len(test.questions)}\n\n"
-    question_text = test_progress + current_question.question_text
+    question_text = test_progress + current_question.text
 
-    if test.picture:
-        image_url = f"{settings.media.base_url}/{test.picture}"
-        await message.edit_media(
-            media=types.InputMediaPhoto(media=image_url, caption=question_text),
-            reply_markup=keyboard
-        )
-    else:
-        await message.edit_text(text=question_text, reply_markup=keyboard)
+    await message_renderer.show(message, question_text, test.picture, reply_markup=keyboard)
 
     await state.set_state(PsycoTestState.answering_questions)
 
 @router.callback_query(PsycoTestState.answering_questions, lambda c: c.data == "back_question")
 async def go_back_question(callback_query: types.CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    current_question_index = data['current_question_index']
-    
-    if current_question_index > 0:
-        data['current_question_index'] -= 1
-        data['score'] -= data['answers'].pop().score_value
-        await state.set_data(data)
+    session, test = await load_test_session(callback_query.message, state)
+    if not test:
+        await callback_query.answer()
+        return
+
+    if revert_answer(session, test):
+        await session.save(state)
         await send_next_question(callback_query.message, state)
     
     await callback_query.answer()
@@ -171,36 +146,32 @@ async def go_back_question(callback_query: types.CallbackQuery, state: FSMContex
 async def process_answer(callback_query: types.CallbackQuery, state: FSMContext):
     answer_id = callback_query.data.split(':')[1]
     
-    data = await state.get_data()
-    test = data['test']
-    current_question_index = data['current_question_index']
-    current_question = test.questions[current_question_index]
-    
-    answer_option = next((a for a in current_question.answer_options if str(a.id) == answer_id), None)
-    
-    if not answer_option:
-        await callback_query.answer("Answer not found.")
+    session, test = await load_test_session(callback_query.message, state)
+    if not test:
+        await callback_query.answer()
         return
 
-    score = data['score']
-    score += answer_option.score_value
-
-    answers = data['answers']
-    answers.append(answer_option)
+    if not apply_answer(session, test, answer_id):
+        await callback_query.answer("Answer not found.")
+        return
 
-    await state.update_data(score=score, answers=answers, current_question_index=current_question_index + 1)
+    await session.save(state)
     
     await send_next_question(callback_query.message, state)
     await callback_query.answer()
 
 async def end_test(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    test = data['test']
-    score = data['score']
-    answers = data['answers']
+    session, test = await load_test_session(message, state)
+    if not test:
+        return
+
+    score = session.score
+    answers = chosen_options(session, test)
+
+    result = test.results.find(score)
+    # Saved in the background, even if the score has no interpretation
+    psyco_result_writer.record(message.chat.id, session, test, result)
 
-    result = next((r for r in test.results if r.min_score <= score <= r.max_score), None)
-    
     if not result:
         await message.edit_text("Unable to interpret your results. Please contact the administrator.")
         await state.clear()
@@ -208,18 +179,12 @@ async def end_test(message: types.Message, state: FSMContext):
 
     result_text = (
         f"Test completed!\n\n"
-        f"Your answers:\n" + "\n".join(f"{i+1}. {answer.answer.answer_text}" for i, answer in enumerate(answers)) + "\n\n"
+        f"Your answers:\n" + "\n".join(f"{i+1}. {answer.text}" for i, answer in enumerate(answers)) + "\n\n"
         f"Your score: {score}\n\n"
         f"Interpretation:\n{result.text}"
     )
 
-    if test.picture:
-        image_url = f"{settings.media.base_url}/{test.picture}"
-        await message.edit_media(
-            media=types.InputMediaPhoto(media=image_url, caption=result_text)
-        )
-    else:
-        await message.edit_text(result_text)
+    await message_renderer.show(message, result_text, test.picture)
 
     logger.info(f"User {message.from_user.id} completed test {test.id} with score {score}")
     await state.clear()
@@ -1,6 +1,7 @@
 # main.py
 
 import logging
+import secrets
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -12,53 +13,95 @@ from fastapi.responses import ORJSONResponse, JSONResponse
 from fastapi import FastAPI, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from fastapi.staticfiles import StaticFiles
 import uvicorn
-from sqladmin import Admin
 
 from core.admin import async_sqladmin_db_helper, sqladmin_authentication_backend
-from core.models import db_helper
+from core.models import engine_registry
 from core.admin.models import setup_admin
+from core.admin.admin_panel import AdminPanel
 
 from core import settings, logger
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, types
 from handlers import router as main_router
+from services import UserService, create_fsm_storage, create_events_isolation, broadcast_manager, psyco_result_writer, MediaStaticFiles, startup, metrics, setup_bot_metrics
 
 # Initialize bot and dispatcher
 def setup_bot():
     session = AiohttpSession(timeout=60)
     bot = Bot(token=settings.bot.token, session=session)
-    dp = Dispatcher()
+    storage = create_fsm_storage()
+    dp = Dispatcher(storage=storage, events_isolation=create_events_isolation(storage))
     dp.include_router(main_router)
+    setup_bot_metrics(bot, dp)
     return bot, dp
 
 # Global variables for bot and dispatcher
 bot = None
 dp = None
 polling_task = None
+startup_task = None
+# Set once shutdown begins, later webhook updates are refused so Telegram delivers them again to the next start
+shutting_down = False
+# Webhook updates are handled in the background, keep references so the tasks are not garbage collected
+webhook_tasks: set[asyncio.Task] = set()
+
+async def start_bot():
+    """
+    Starts receiving updates once the startup phases are done, so the first updates meet warm pools and catalogs.
+    """
+    global polling_task
+    if not await startup.run():
+        logger.error("Startup failed, the bot does not receive updates. See /ready for the failed phases")
+        return
+
+    try:
+        if settings.bot.update_mode == "webhook":
+            # Every worker registers the same URL and secret, so this is safe to repeat
+            await dp.emit_startup(bot=bot)
+            await bot.set_webhook(
+                url=settings.bot.webhook_url,
+                secret_token=settings.bot.webhook_secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"Receiving updates through webhook {settings.bot.webhook_url}")
+        else:
+            # Start polling in a separate task
+            polling_task = asyncio.create_task(dp.start_polling(bot))
+
+        # Continue broadcasts interrupted by the previous shutdown or crash
+        await broadcast_manager.resume(bot)
+    except Exception as e:
+        logger.exception(f"Error in start_bot: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    global bot, dp, polling_task
+    global bot, dp, startup_task, shutting_down
     # Startup
     logger.info("Starting up the FastAPI application...")
 
     # Initialize bot and dispatcher
     bot, dp = setup_bot()
-    
-    # Start polling in a separate task
-    polling_task = asyncio.create_task(dp.start_polling(bot))
+
+    # HTTP is served while the startup phases run, /ready reports their progress
+    startup_task = asyncio.create_task(start_bot())
 
     yield
 
     # Shutdown
     logger.info("Shutting down the FastAPI application...")
+    shutting_down = True
 
-    await db_helper.dispose()
-    await async_sqladmin_db_helper.dispose()
+    if not startup_task.done():
+        startup.cancel()
+        startup_task.cancel()
+        try:
+            await startup_task
+        except asyncio.CancelledError:
+            pass
 
-    # Stop polling
+    # Stop receiving updates first and let the handlers already running finish,
+    # everything they write still goes into the buffers below
     if polling_task:
         polling_task.cancel()
         try:
@@ -66,9 +109,25 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         except asyncio.CancelledError:
             pass
 
-    # Close bot session
+    if settings.bot.update_mode == "webhook":
+        if webhook_tasks:
+            await asyncio.gather(*webhook_tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot)
+
+    # Running broadcasts save their progress and are resumed by the next start
+    await broadcast_manager.shutdown()
+    # Write the /start upserts and test results still waiting in the write-behind buffers
+    await UserService.close()
+    await psyco_result_writer.close()
+
+    # Nothing uses the database after this
+    await engine_registry.dispose()
+
+    # Close bot session and FSM storage
     if bot:
         await bot.session.close()
+    if dp:
+        await dp.storage.close()
 
     logger.info("Bot stopped successfully")
 
@@ -79,11 +138,11 @@ main_app = FastAPI(
 )
 
 # Mount media storage
-main_app.mount("/media/movie_quiz", StaticFiles(directory=settings.media.movie_quiz_path), name="movie_quiz")
-main_app.mount("/media/psyco_tests", StaticFiles(directory=settings.media.psyco_test_path), name="psyco_tests")
+main_app.mount("/media/movie_quiz", MediaStaticFiles(directory=settings.media.movie_quiz_path), name="movie_quiz")
+main_app.mount("/media/psyco_tests", MediaStaticFiles(directory=settings.media.psyco_test_path), name="psyco_tests")
 
 # SQLAdmin
-admin = Admin(main_app, engine=async_sqladmin_db_helper.engine, authentication_backend=sqladmin_authentication_backend)
+admin = AdminPanel(main_app, session_maker=async_sqladmin_db_helper.session_factory, authentication_backend=sqladmin_authentication_backend)
 
 # Register admin views
 setup_admin(admin)
@@ -95,6 +154,47 @@ async def favicon():
     return Response(status_code=204)
 
 
+# Connection pool usage of this worker
+@main_app.get('/db/pools', include_in_schema=False)
+async def db_pools():
+    return engine_registry.stats()
+
+
+# Readiness of this worker: 200 once every enabled startup phase is done, 503 with the status
+# (starting, degraded or failed) and the phases that are not done otherwise
+@main_app.get('/ready', include_in_schema=False)
+async def ready():
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.report())
+
+
+# Prometheus metrics of this worker
+@main_app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    return Response(content=await metrics.render(), media_type=metrics.content_type)
+
+
+# Telegram webhook, feeds updates into the same dispatcher the polling mode uses
+@main_app.post(settings.bot.webhook_path, include_in_schema=False)
+async def bot_webhook(request: Request):
+    if settings.bot.update_mode != "webhook" or dp is None:
+        return Response(status_code=404)
+    if shutting_down:
+        return Response(status_code=503)
+
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secrets.compare_digest(token, settings.bot.webhook_secret_token):
+        return Response(status_code=403)
+
+    update = types.Update.model_validate(await request.json(), context={"bot": bot})
+
+    # Answer Telegram right away, the handler may take a while (e.g. a broadcast)
+    task = asyncio.create_task(dp.feed_update(bot, update))
+    webhook_tasks.add(task)
+    task.add_done_callback(webhook_tasks.discard)
+
+    return Response(status_code=200)
+
+
 # Global exception handler
 @main_app.middleware("http")
 async def catch_exceptions_middleware(request: Request, call_next):
@@ -136,4 +236,5 @@ if __name__ == '__main__':
         host=settings.run.host,
         port=settings.run.port,
         reload=settings.run.debug,
+        workers=settings.run.workers,
     )
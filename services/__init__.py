@@ -2,7 +2,44 @@ __all__ = [
     "UserService",
     "movie_quiz_storage",
     "psyco_test_storage",
+    "psyco_test_catalog",
+    "apply_answer",
+    "revert_answer",
+    "chosen_options",
+    "psyco_result_writer",
+    "telegram_media",
+    "answer_photo",
+    "edit_photo",
+    "message_renderer",
+    "MediaStaticFiles",
+    "movie_quiz_catalog",
+    "PsycoTestSession",
+    "MovieQuizSession",
+    "create_fsm_storage",
+    "create_events_isolation",
+    "compile_broadcast_plan",
+    "execute_broadcast_plan",
+    "BroadcastRecipients",
+    "BroadcastService",
+    "broadcast_manager",
+    "startup",
+    "metrics",
+    "setup_bot_metrics",
 ]
 
 from .user_service import UserService
 from .fastapi_storage import movie_quiz_storage, psyco_test_storage
+from .psyco_test_catalog import psyco_test_catalog
+from .psyco_scoring import apply_answer, revert_answer, chosen_options
+from .psyco_result_writer import psyco_result_writer
+from .telegram_media import telegram_media, answer_photo, edit_photo
+from .message_render import message_renderer
+from .media_server import MediaStaticFiles
+from .movie_quiz_catalog import movie_quiz_catalog
+from .fsm_sessions import PsycoTestSession, MovieQuizSession
+from .fsm_storage import create_fsm_storage, create_events_isolation
+from .broadcast_plan import compile_broadcast_plan, execute_broadcast_plan
+from .broadcast_recipients import BroadcastRecipients
+from .broadcast import BroadcastService, broadcast_manager
+from .metrics import metrics, setup_bot_metrics
+from .startup import startup
@@ -0,0 +1,465 @@
+# services/broadcast.py
+
+"""
+Broadcast jobs.
+
+A job and one delivery row per recipient are stored in the database when the admin confirms a broadcast.
+A pool of workers then sends the messages under Telegram limits (a global token bucket shared by all jobs
+and a small bucket per chat), backs off on RetryAfter and writes delivery statuses in batches.
+Jobs interrupted by a restart are resumed on startup, the admin gets progress reports and can cancel the job.
+Delivery is at-least-once: recipients sent right before a crash may get the broadcast again after resume.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from sqlalchemy import and_, bindparam, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import UUID
+
+from core import logger, settings
+from core.models import background_db_helper
+from core.models.broadcast import BroadcastJob, BroadcastDelivery
+from .broadcast_plan import compile_broadcast_plan
+from .broadcast_recipients import BroadcastRecipients
+from .metrics import broadcast_deliveries
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second with bursts up to `capacity`. Waiters are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastService:
+
+    @staticmethod
+    async def create_job(created_by: int, messages: list[dict], recipients: BroadcastRecipients) -> uuid.UUID | None:
+        async with background_db_helper.session_factory() as session:
+            try:
+                job = BroadcastJob(created_by=created_by, messages=messages, status=BroadcastJob.PENDING)
+                session.add(job)
+                await session.flush()
+
+                # One set-based statement instead of loading every user into the application.
+                # Python-side defaults are skipped, so every row gets its own id from gen_random_uuid()
+                result = await session.execute(
+                    insert(BroadcastDelivery.__table__).from_select(
+                        ["chat_id", "job_id", "status", "is_active"],
+                        recipients.chat_ids().add_columns(
+                            literal(job.id, UUID(as_uuid=True)),
+                            literal(BroadcastDelivery.PENDING),
+                            literal(True),
+                        ),
+                        include_defaults=False,
+                    )
+                )
+                job.total_count = result.rowcount
+                await session.commit()
+                return job.id
+            except Exception as e:
+                logger.exception(f"Error in create_job: {e}")
+                await session.rollback()
+                return None
+
+    @staticmethod
+    async def claim_job(job_id: uuid.UUID) -> BroadcastJob | None:
+        """
+        Marks a pending or crashed job as running by this process. Returns None if somebody else runs it.
+        """
+        stale_before = func.now() - timedelta(seconds=settings.broadcast.stale_after)
+        async with background_db_helper.session_factory() as session:
+            try:
+                result = await session.execute(
+                    update(BroadcastJob).where(
+                        BroadcastJob.id == job_id,
+                        or_(
+                            BroadcastJob.status == BroadcastJob.PENDING,
+                            and_(
+                                BroadcastJob.status == BroadcastJob.RUNNING,
+                                or_(BroadcastJob.heartbeat_at.is_(None), BroadcastJob.heartbeat_at < stale_before),
+                            ),
+                        ),
+                    ).values(status=BroadcastJob.RUNNING, heartbeat_at=func.now()).returning(BroadcastJob)
+                )
+                job = result.scalar_one_or_none()
+                await session.commit()
+                return job
+            except Exception as e:
+                logger.exception(f"Error in claim_job: {e}")
+                await session.rollback()
+                return None
+
+    @staticmethod
+    async def get_resumable_job_ids() -> list[uuid.UUID]:
+        stale_before = func.now() - timedelta(seconds=settings.broadcast.stale_after)
+        async with background_db_helper.session_factory() as session:
+            try:
+                result = await session.execute(
+                    select(BroadcastJob.id).where(
+                        or_(
+                            BroadcastJob.status == BroadcastJob.PENDING,
+                            and_(
+                                BroadcastJob.status == BroadcastJob.RUNNING,
+                                or_(BroadcastJob.heartbeat_at.is_(None), BroadcastJob.heartbeat_at < stale_before),
+                            ),
+                        )
+                    ).order_by(BroadcastJob.created_at)
+                )
+                return list(result.scalars().all())
+            except Exception as e:
+                logger.exception(f"Error in get_resumable_job_ids: {e}")
+                return []
+
+    @staticmethod
+    async def cancel_job(job_id: uuid.UUID) -> bool:
+        async with background_db_helper.session_factory() as session:
+            try:
+                result = await session.execute(
+                    update(BroadcastJob).where(
+                        BroadcastJob.id == job_id,
+                        BroadcastJob.status.in_([BroadcastJob.PENDING, BroadcastJob.RUNNING]),
+                    ).values(status=BroadcastJob.CANCELLED, finished_at=func.now())
+                )
+                await session.commit()
+                return result.rowcount > 0
+            except Exception as e:
+                logger.exception(f"Error in cancel_job: {e}")
+                await session.rollback()
+                return False
+
+    @staticmethod
+    async def release_job(job_id: uuid.UUID) -> None:
+        """
+        Gives a running job back on graceful shutdown, so the next process resumes it without waiting.
+        """
+        async with background_db_helper.session_factory() as session:
+            try:
+                await session.execute(
+                    update(BroadcastJob).where(
+                        BroadcastJob.id == job_id,
+                        BroadcastJob.status == BroadcastJob.RUNNING,
+                    ).values(status=BroadcastJob.PENDING, heartbeat_at=None)
+                )
+                await session.commit()
+            except Exception as e:
+                logger.exception(f"Error in release_job: {e}")
+                await session.rollback()
+
+    @staticmethod
+    async def finish_job(job_id: uuid.UUID) -> None:
+        async with background_db_helper.session_factory() as session:
+            try:
+                await session.execute(
+                    update(BroadcastJob).where(
+                        BroadcastJob.id == job_id,
+                        BroadcastJob.status == BroadcastJob.RUNNING,
+                    ).values(status=BroadcastJob.COMPLETED, finished_at=func.now())
+                )
+                await session.commit()
+            except Exception as e:
+                logger.exception(f"Error in finish_job: {e}")
+                await session.rollback()
+
+
+class BroadcastRunner:
+    def __init__(self, bot: Bot, job: BroadcastJob, global_bucket: TokenBucket):
+        self.bot = bot
+        self.job_id = job.id
+        self.created_by = job.created_by
+        self.total = job.total_count
+        self.sent = job.sent_count
+        self.failed = job.failed_count
+        self.plan = compile_broadcast_plan([types.Message.model_validate(raw) for raw in job.messages])
+        self.global_bucket = global_bucket
+        self.cancelled = asyncio.Event()
+
+        self._sent_ids: list[int] = []
+        self._failed: list[dict] = []
+        self._progress_message_id: int | None = None
+        self._progress_reported_at = 0.0
+
+    async def run(self) -> None:
+        workers_count = settings.broadcast.workers
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers_count * 2)
+
+        await self._report_progress(force=True)
+        flusher = asyncio.create_task(self._flush_loop())
+        workers: list[asyncio.Task] = []
+        completed = False
+        try:
+            workers = [asyncio.create_task(self._work(queue)) for _ in range(workers_count)]
+            await self._produce(queue, workers_count)
+            await asyncio.gather(*workers)
+            completed = True
+        except Exception as e:
+            logger.exception(f"Broadcast {self.job_id} stopped: {e}")
+        finally:
+            # Whatever stopped the run, nothing may keep sending or bumping the heartbeat of the job
+            flusher.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(flusher, *workers, return_exceptions=True)
+            await self._flush()
+            if not completed:
+                # The pending deliveries are sent by whoever resumes the job
+                await BroadcastService.release_job(self.job_id)
+        if not completed:
+            await self._report_interrupted()
+            return
+
+        if not self.cancelled.is_set():
+            await BroadcastService.finish_job(self.job_id)
+        await self._report_result()
+        logger.info(f"Broadcast {self.job_id} finished: sent {self.sent}, failed {self.failed}, cancelled {self.cancelled.is_set()}")
+
+    async def _produce(self, queue: asyncio.Queue, workers_count: int) -> None:
+        last_chat_id = None
+        while not self.cancelled.is_set():
+            async with background_db_helper.session_factory() as session:
+                stmt = select(BroadcastDelivery.chat_id).where(
+                    BroadcastDelivery.job_id == self.job_id,
+                    BroadcastDelivery.status == BroadcastDelivery.PENDING,
+                )
+                if last_chat_id is not None:
+                    stmt = stmt.where(BroadcastDelivery.chat_id > last_chat_id)
+                result = await session.execute(stmt.order_by(BroadcastDelivery.chat_id).limit(settings.broadcast.batch_size))
+                chat_ids = result.scalars().all()
+
+            if not chat_ids:
+                break
+            for chat_id in chat_ids:
+                if self.cancelled.is_set():
+                    break
+                await queue.put(chat_id)
+            last_chat_id = chat_ids[-1]
+
+        for _ in range(workers_count):
+            await queue.put(None)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            chat_id = await queue.get()
+            if chat_id is None:
+                return
+            if self.cancelled.is_set():
+                continue
+
+            try:
+                await self._send_to(chat_id)
+                self._sent_ids.append(chat_id)
+                broadcast_deliveries.inc("sent")
+            except Exception as e:
+                logger.info(f"Failed to send broadcast {self.job_id} to user {chat_id}: {str(e)}")
+                self._failed.append({"b_chat_id": chat_id, "b_error": str(e)[:1000]})
+                broadcast_deliveries.inc("failed")
+
+    async def _call(self, chat_bucket: TokenBucket, method, *args, **kwargs):
+        max_attempts = settings.broadcast.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await method(*args, **kwargs)
+            except TelegramRetryAfter as e:
+                # Flood control is per bot, so every worker has to wait
+                logger.warning(f"Broadcast {self.job_id} hit flood control, retry after {e.retry_after}s")
+                self.global_bucket.pause(e.retry_after)
+                if attempt == max_attempts:
+                    raise
+            except (TelegramNetworkError, TelegramServerError):
+                if attempt == max_attempts:
+                    raise
+                await asyncio.sleep(attempt)
+
+    async def _send_to(self, chat_id: int) -> None:
+        chat_bucket = TokenBucket(settings.broadcast.per_chat_rate, settings.broadcast.per_chat_burst)
+        for operation in self.plan:
+            await self._call(chat_bucket, getattr(self.bot, operation.method), chat_id, *operation.args, **operation.kwargs)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.broadcast.flush_interval)
+            await self._flush()
+            await self._report_progress()
+
+    async def _flush(self) -> None:
+        """
+        Writes delivery statuses collected since the last flush, bumps the job counters and heartbeat
+        and picks up a cancellation made by another process.
+        """
+        sent_ids, self._sent_ids = self._sent_ids, []
+        failed, self._failed = self._failed, []
+        deliveries = BroadcastDelivery.__table__
+
+        async with background_db_helper.session_factory() as session:
+            try:
+                if sent_ids:
+                    await session.execute(
+                        update(deliveries).where(
+                            deliveries.c.job_id == self.job_id,
+                            deliveries.c.chat_id.in_(sent_ids),
+                        ).values(status=BroadcastDelivery.SENT, sent_at=func.now())
+                    )
+                if failed:
+                    await session.execute(
+                        update(deliveries).where(
+                            deliveries.c.job_id == self.job_id,
+                            deliveries.c.chat_id == bindparam("b_chat_id"),
+                        ).values(status=BroadcastDelivery.FAILED, error=bindparam("b_error")),
+                        failed,
+                    )
+                result = await session.execute(
+                    update(BroadcastJob).where(BroadcastJob.id == self.job_id).values(
+                        sent_count=BroadcastJob.sent_count + len(sent_ids),
+                        failed_count=BroadcastJob.failed_count + len(failed),
+                        heartbeat_at=func.now(),
+                    ).returning(BroadcastJob.status)
+                )
+                status = result.scalar_one()
+                await session.commit()
+            except Exception as e:
+                logger.exception(f"Error in broadcast flush: {e}")
+                await session.rollback()
+                # Keep the results for the next flush
+                self._sent_ids.extend(sent_ids)
+                self._failed.extend(failed)
+                return
+
+        self.sent += len(sent_ids)
+        self.failed += len(failed)
+        if status == BroadcastJob.CANCELLED:
+            self.cancelled.set()
+
+    def _progress_text(self) -> str:
+        done = self.sent + self.failed
+        return (f"Рассылка {self.job_id}\n"
+                f"Обработано {done} из {self.total} пользователей: отправлено {self.sent}, ошибок {self.failed}.")
+
+    async def _report_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._progress_reported_at < settings.broadcast.progress_interval:
+            return
+        self._progress_reported_at = now
+
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text="Отменить рассылку", callback_data=f"broadcast_cancel:{self.job_id}")]
+        ])
+        try:
+            if self._progress_message_id is None:
+                message = await self.bot.send_message(self.created_by, self._progress_text(), reply_markup=keyboard)
+                self._progress_message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(
+                    text=self._progress_text(), chat_id=self.created_by,
+                    message_id=self._progress_message_id, reply_markup=keyboard,
+                )
+        except TelegramBadRequest:
+            pass  # Message is not modified
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast progress to {self.created_by}: {e}")
+
+    async def _report_interrupted(self) -> None:
+        text = (f"Рассылка {self.job_id} прервана из-за ошибки: отправлено {self.sent}, ошибок {self.failed}. "
+                f"Оставшимся пользователям она будет отправлена после перезапуска бота.")
+        try:
+            await self.bot.send_message(self.created_by, text)
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast interruption to {self.created_by}: {e}")
+
+    async def _report_result(self) -> None:
+        if self.cancelled.is_set():
+            text = f"Рассылка отменена: успешно отправлено {self.sent} пользователям, ошибок {self.failed}."
+        elif self.failed:
+            text = (f"Рассылка выполнена, успешно отправлено {self.sent} пользователям, "
+                    f"но не удалось отправить сообщение {self.failed} пользователям. "
+                    f"Пользователи могли не активировать чат с ботом.")
+        else:
+            text = f"Рассылка выполнена успешно: отправлено всем {self.sent} пользователям."
+
+        try:
+            await self.bot.send_message(self.created_by, text)
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast result to {self.created_by}: {e}")
+
+
+class BroadcastManager:
+    """
+    Runs broadcast jobs of this process in background tasks.
+    """
+
+    def __init__(self):
+        self._runners: dict[uuid.UUID, tuple[asyncio.Task, BroadcastRunner]] = {}
+        self._global_bucket: TokenBucket | None = None
+
+    @property
+    def global_bucket(self) -> TokenBucket:
+        # Shared by all jobs: the Telegram limit is per bot, not per broadcast
+        if self._global_bucket is None:
+            rate = settings.broadcast.global_rate
+            self._global_bucket = TokenBucket(rate, rate)
+        return self._global_bucket
+
+    async def start(self, bot: Bot, job_id: uuid.UUID) -> bool:
+        job = await BroadcastService.claim_job(job_id)
+        if job is None:
+            return False
+
+        runner = BroadcastRunner(bot, job, self.global_bucket)
+        task = asyncio.create_task(runner.run())
+        self._runners[job.id] = (task, runner)
+        task.add_done_callback(lambda _: self._runners.pop(job.id, None))
+        logger.info(f"Started broadcast {job.id} for {job.total_count} users")
+        return True
+
+    async def resume(self, bot: Bot) -> None:
+        for job_id in await BroadcastService.get_resumable_job_ids():
+            if job_id not in self._runners and await self.start(bot, job_id):
+                logger.info(f"Resumed broadcast {job_id}")
+
+    async def cancel(self, job_id: uuid.UUID) -> bool:
+        cancelled = await BroadcastService.cancel_job(job_id)
+        entry = self._runners.get(job_id)
+        if entry:
+            entry[1].cancelled.set()
+        return cancelled
+
+    async def shutdown(self) -> None:
+        tasks = [task for task, _ in self._runners.values()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcast_manager = BroadcastManager()
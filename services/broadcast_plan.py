@@ -0,0 +1,111 @@
+# services/broadcast_plan.py
+
+"""
+Broadcast plan: the collected broadcast messages compiled once into ready-to-send Bot API calls.
+
+Photos and videos are grouped into media groups and documents into batches of 10, the same way
+the messages were grouped before, but only once per broadcast instead of once per recipient.
+The admin preview and the broadcast workers execute the same plan.
+"""
+
+from aiogram import Bot, types
+from aiogram.enums import ContentType
+
+from utils import FrozenSlots
+
+
+MEDIA_GROUP_SIZE = 10
+
+
+class BroadcastOperation(FrozenSlots):
+    """
+    One Bot API call without the chat id: bot.<method>(chat_id, *args, **kwargs).
+    """
+    __slots__ = ("method", "args", "kwargs")
+
+    def __repr__(self):
+        return f"<BroadcastOperation({self.method})>"
+
+
+def _operation(method: str, *args, **kwargs) -> BroadcastOperation:
+    return BroadcastOperation(method=method, args=args, kwargs=kwargs)
+
+
+def _media_operation(media: list) -> BroadcastOperation:
+    # Telegram rejects media groups of a single item
+    if len(media) == 1:
+        item = media[0]
+        method = "send_photo" if isinstance(item, types.InputMediaPhoto) else "send_video"
+        return _operation(method, item.media, caption=item.caption, caption_entities=item.caption_entities)
+    return _operation("send_media_group", tuple(media))
+
+
+def _single_operation(msg: types.Message, entities) -> BroadcastOperation:
+    if msg.content_type == ContentType.TEXT:
+        return _operation("send_message", msg.text, entities=entities)
+    if msg.content_type == ContentType.AUDIO:
+        return _operation("send_audio", msg.audio.file_id, caption=msg.caption, caption_entities=entities)
+    if msg.content_type == ContentType.ANIMATION:
+        return _operation("send_animation", msg.animation.file_id, caption=msg.caption, caption_entities=entities)
+    if msg.content_type == ContentType.VOICE:
+        return _operation("send_voice", msg.voice.file_id, caption=msg.caption, caption_entities=entities)
+    if msg.content_type == ContentType.VIDEO_NOTE:
+        return _operation("send_video_note", msg.video_note.file_id)
+    if msg.content_type == ContentType.STICKER:
+        return _operation("send_sticker", msg.sticker.file_id)
+    if msg.content_type == ContentType.LOCATION:
+        return _operation("send_location", msg.location.latitude, msg.location.longitude)
+    if msg.content_type == ContentType.VENUE:
+        return _operation("send_venue", msg.venue.location.latitude, msg.venue.location.longitude, msg.venue.title, msg.venue.address)
+    if msg.content_type == ContentType.CONTACT:
+        return _operation("send_contact", msg.contact.phone_number, msg.contact.first_name, msg.contact.last_name)
+    return _operation("send_message", f"Извините, не поддерживаемый тип контента: {msg.content_type}.")
+
+
+def compile_broadcast_plan(messages: list[types.Message]) -> tuple[BroadcastOperation, ...]:
+    plan = []
+    grouped_media = []
+    grouped_documents = []
+
+    def flush_groups():
+        if grouped_media:
+            plan.append(_media_operation(grouped_media))
+            grouped_media.clear()
+        if grouped_documents:
+            plan.extend(grouped_documents)
+            grouped_documents.clear()
+
+    for msg in messages:
+        entities = msg.entities or msg.caption_entities
+
+        if msg.content_type in [ContentType.PHOTO, ContentType.VIDEO]:
+            media = types.InputMediaPhoto(media=msg.photo[-1].file_id) if msg.content_type == ContentType.PHOTO else types.InputMediaVideo(media=msg.video.file_id)
+            media.caption = msg.caption
+            media.caption_entities = entities
+            grouped_media.append(media)
+
+            if len(grouped_media) == MEDIA_GROUP_SIZE:
+                plan.append(_media_operation(grouped_media))
+                grouped_media.clear()
+
+        elif msg.content_type == ContentType.DOCUMENT:
+            grouped_documents.append(
+                _operation("send_document", msg.document.file_id, caption=msg.caption, caption_entities=entities)
+            )
+
+            if len(grouped_documents) == MEDIA_GROUP_SIZE:
+                plan.extend(grouped_documents)
+                grouped_documents.clear()
+
+        else:
+            # Send any remaining grouped media or documents before other types of content
+            flush_groups()
+            plan.append(_single_operation(msg, entities))
+
+    flush_groups()
+    return tuple(plan)
+
+
+async def execute_broadcast_plan(bot: Bot, chat_id: int, plan: tuple[BroadcastOperation, ...]) -> None:
+    for operation in plan:
+        await getattr(bot, operation.method)(chat_id, *operation.args, **operation.kwargs)
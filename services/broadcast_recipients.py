@@ -0,0 +1,87 @@
+# services/broadcast_recipients.py
+
+"""
+Broadcast recipients: a filter over tg_users that only ever selects chat ids.
+
+The filtered statement is used set-based (INSERT ... SELECT of the delivery rows of a job and the
+recipient count), so no caller has to load the users as ORM objects.
+"""
+
+import uuid
+
+from sqlalchemy import Select, exists, func, select
+
+from core import logger
+from core.models import db_helper
+from core.models.send_test import SentTest
+from core.models.tg_user import TGUser
+
+
+class BroadcastRecipients:
+    """
+    Who gets a broadcast. Kept in FSM data as a list while the admin composes the broadcast.
+    """
+    __slots__ = ("active_only", "superusers_only", "completed_test_id")
+
+    def __init__(self, active_only: bool = True, superusers_only: bool = False, completed_test_id: str | None = None):
+        self.active_only = active_only
+        self.superusers_only = superusers_only
+        self.completed_test_id = str(completed_test_id) if completed_test_id else None
+
+    @classmethod
+    def parse(cls, args: str | None) -> "BroadcastRecipients":
+        """
+        Parses the /broadcast arguments: "all" (include deactivated users), "superusers", "test <test id>".
+        """
+        recipients = cls()
+        words = (args or "").split()
+        while words:
+            word = words.pop(0).lower()
+            if word == "all":
+                recipients.active_only = False
+            elif word == "superusers":
+                recipients.superusers_only = True
+            elif word == "test" and words:
+                recipients.completed_test_id = str(uuid.UUID(words.pop(0)))
+            else:
+                raise ValueError(f"Unknown broadcast filter: {word}")
+        return recipients
+
+    def dump(self) -> list:
+        return [self.active_only, self.superusers_only, self.completed_test_id]
+
+    @classmethod
+    def from_data(cls, data: dict) -> "BroadcastRecipients":
+        raw = data.get("recipients")
+        return cls(*raw) if raw else cls()
+
+    def describe(self) -> str:
+        parts = ["активные пользователи" if self.active_only else "все пользователи"]
+        if self.superusers_only:
+            parts.append("только администраторы")
+        if self.completed_test_id:
+            parts.append(f"прошедшие тест {self.completed_test_id}")
+        return ", ".join(parts)
+
+    def chat_ids(self) -> Select:
+        stmt = select(TGUser.chat_id)
+        if self.active_only:
+            stmt = stmt.where(TGUser.is_active == True)
+        if self.superusers_only:
+            stmt = stmt.where(TGUser.is_superuser == True)
+        if self.completed_test_id:
+            stmt = stmt.where(exists().where(
+                SentTest.receiver_id == TGUser.chat_id,
+                SentTest.test_id == uuid.UUID(self.completed_test_id),
+                SentTest.is_completed == True,
+            ))
+        return stmt
+
+    async def count(self) -> int:
+        async with db_helper.session_factory() as session:
+            try:
+                result = await session.execute(select(func.count()).select_from(self.chat_ids().subquery()))
+                return result.scalar_one()
+            except Exception as e:
+                logger.exception(f"Error in BroadcastRecipients.count: {e}")
+                return 0
@@ -1,10 +1,24 @@
+import asyncio
+import contextlib
+import hashlib
 import os
+import uuid
 from typing import Optional, List
 
+import aiofiles
+import aiofiles.os
 from fastapi import UploadFile
 from fastapi_storages import FileSystemStorage
+from sqlalchemy.dialects.postgresql import insert
 
 from core import settings, logger
+from core.models import db_helper
+from core.models.media_file import MediaFile
+from .image_pipeline import ProcessedImage, process_image
+
+
+class UploadTooLarge(ValueError):
+    pass
 
 
 class CustomFileSystemStorage(FileSystemStorage):
@@ -14,22 +28,78 @@ class CustomFileSystemStorage(FileSystemStorage):
         super().__init__(self.root_path)
 
     async def put(self, file: UploadFile) -> str:
+        """
+        Stores the upload under the hash of its content and returns the stored name.
+        The same name may be referenced by several records, so stored files are never deleted by the app.
+        The upload is streamed to disk in chunks; resizing runs in a worker thread,
+        so the event loop keeps serving the bot while a large picture is uploaded.
+        """
         if not self._check_extension(file.filename):
             raise ValueError(f"File extension not allowed. Allowed extensions: {', '.join(self.allowed_extensions)}")
 
-        os.makedirs(self.root_path, exist_ok=True)
-        full_path = os.path.join(self.root_path, file.filename)
+        staged_path, sha256 = await self._stream_to_staging(file)
+        image = await asyncio.to_thread(process_image, self.root_path, staged_path, sha256, file.filename)
+        await self._record(image, file.filename)
 
-        content = await file.read()
-        with open(full_path, "wb") as f:
-            f.write(content)
+        logger.info(
+            f"Stored {file.filename} as {image.original.name} "
+            f"({image.original.width}x{image.original.height}, {image.original.size} -> {image.telegram.size} bytes)"
+        )
+        return image.original.name
 
-        return file.filename
+    async def _stream_to_staging(self, file: UploadFile) -> tuple[str, str]:
+        """
+        Writes the upload to a staging file next to the stored files chunk by chunk, hashing it on the way.
+        Returns (staging path, sha256). Uploads over the size limit are rejected and nothing is left on disk.
+        """
+        max_size = settings.media.max_upload_size
+        if file.size is not None and file.size > max_size:
+            raise UploadTooLarge(f"File is too large: {file.size} bytes, the limit is {max_size} bytes")
+
+        os.makedirs(self.root_path, exist_ok=True)
+        staged_path = os.path.join(self.root_path, f".upload-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(staged_path, "wb") as output:
+                while chunk := await file.read(settings.media.upload_chunk_size):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLarge(f"File is too large: more than {max_size} bytes")
+                    digest.update(chunk)
+                    await output.write(chunk)
+        except BaseException:
+            # The staging file does not exist when opening it failed, keep the original error
+            with contextlib.suppress(FileNotFoundError):
+                await aiofiles.os.remove(staged_path)
+            raise
+        return staged_path, digest.hexdigest()
 
-    def delete(self, name: str) -> None:
-        full_path = os.path.join(self.root_path, name)
-        if os.path.exists(full_path):
-            os.remove(full_path)
+    async def _record(self, image: ProcessedImage, filename: str) -> None:
+        async with db_helper.session_factory() as session:
+            try:
+                stmt = insert(MediaFile.__table__).values(
+                    storage=self.root_path,
+                    name=image.original.name,
+                    sha256=image.sha256,
+                    original_filename=filename,
+                    width=image.original.width,
+                    height=image.original.height,
+                    size=image.original.size,
+                    telegram_name=image.telegram.name,
+                    telegram_width=image.telegram.width,
+                    telegram_height=image.telegram.height,
+                    telegram_size=image.telegram.size,
+                    thumbnail_name=image.thumbnail.name,
+                    thumbnail_size=image.thumbnail.size,
+                    is_active=True,
+                )
+                # The same content was uploaded before
+                await session.execute(stmt.on_conflict_do_nothing(index_elements=["storage", "name"]))
+                await session.commit()
+            except Exception as e:
+                logger.exception(f"Error in CustomFileSystemStorage._record: {e}")
+                await session.rollback()
 
     def _check_extension(self, filename: str) -> bool:
         if not self.allowed_extensions:
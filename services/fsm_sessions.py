@@ -0,0 +1,132 @@
+# services/fsm_sessions.py
+
+"""
+Compact per-user session records kept in aiogram FSM data.
+
+Only ids, counters, seeds and answer indices are stored, display data is resolved from the shared catalogs.
+Records are dumped as plain lists, so they are cheap to copy and can be serialized to any FSM storage.
+"""
+
+import random
+from array import array
+
+from aiogram.fsm.context import FSMContext
+
+from .movie_quiz_catalog import CompiledQuiz, movie_quiz_catalog
+from .psyco_test_catalog import CompiledTest, psyco_test_catalog
+
+
+class PsycoTestSession:
+    """
+    Cursor of a running psyco test: test id, catalog version, running score and the chosen option index
+    for every answered question. The current question index is the number of given answers.
+    """
+    __slots__ = ("test_id", "version", "score", "answers", "sent_test_id")
+
+    key = "psyco_session"
+
+    def __init__(self, test_id: str, version: int, score: int = 0, answers=(), sent_test_id: str | None = None):
+        self.test_id = str(test_id)
+        self.version = version
+        self.score = score
+        # Signed shorts, the type of test_results.answers (SMALLINT[]); far fewer options fit in a keyboard
+        self.answers = array("h", answers)
+        self.sent_test_id = sent_test_id
+
+    @property
+    def index(self) -> int:
+        return len(self.answers)
+
+    def dump(self) -> list:
+        return [self.test_id, self.version, self.score, self.answers.tolist(), self.sent_test_id]
+
+    @classmethod
+    def from_data(cls, data: dict) -> "PsycoTestSession | None":
+        raw = data.get(cls.key)
+        return cls(*raw) if raw else None
+
+    @classmethod
+    async def load(cls, state: FSMContext) -> "PsycoTestSession | None":
+        return cls.from_data(await state.get_data())
+
+    async def save(self, state: FSMContext) -> None:
+        await state.update_data({self.key: self.dump()})
+
+    async def get_test(self) -> CompiledTest | None:
+        """
+        Returns the compiled test, or None if it was removed or changed since the session started.
+        """
+        test = await psyco_test_catalog.get(self.test_id)
+        if test is None or test.version != self.version:
+            return None
+        return test
+
+
+class MovieQuizSession:
+    """
+    Cursor of a running movie quiz: quiz id, catalog version, the seed of the question sample,
+    the positions of the drawn questions in the quiz, the current position and the number of correct answers.
+
+    The sample is drawn once when the quiz starts and stored as positions in the quiz question ids,
+    so answering a question does not touch the rest of the quiz, and any run can be reproduced from its seed.
+    """
+    __slots__ = ("quiz_id", "version", "seed", "sample", "position", "correct_answers")
+
+    key = "quiz_session"
+
+    def __init__(self, quiz_id: str, version: int, seed: int, sample, position: int = 0, correct_answers: int = 0):
+        self.quiz_id = str(quiz_id)
+        self.version = version
+        self.seed = seed
+        self.sample = array("I", sample)
+        self.position = position
+        self.correct_answers = correct_answers
+
+    @classmethod
+    def start(cls, quiz: CompiledQuiz, count: int = 0) -> "MovieQuizSession":
+        """
+        New session over `count` random questions of the quiz, all of them when count is 0.
+        """
+        total = len(quiz.question_ids)
+        count = min(count, total) if count else total
+        seed = random.getrandbits(32)
+        # Sampling a range only draws count numbers, the quiz size does not matter
+        return cls(quiz.id, quiz.version, seed, random.Random(seed).sample(range(total), count))
+
+    @property
+    def count(self) -> int:
+        return len(self.sample)
+
+    def question_id(self, quiz: CompiledQuiz):
+        return quiz.question_ids[self.sample[self.position]]
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= self.count
+
+    def dump(self) -> list:
+        return [self.quiz_id, self.version, self.seed, self.sample.tolist(), self.position, self.correct_answers]
+
+    @classmethod
+    def from_data(cls, data: dict) -> "MovieQuizSession | None":
+        raw = data.get(cls.key)
+        # Records of former layouts (a stored question order or a sample size) are dropped, the quiz is started again
+        if not raw or len(raw) != 6 or not isinstance(raw[3], list):
+            return None
+        return cls(*raw)
+
+    @classmethod
+    async def load(cls, state: FSMContext) -> "MovieQuizSession | None":
+        return cls.from_data(await state.get_data())
+
+    async def save(self, state: FSMContext) -> None:
+        await state.update_data({self.key: self.dump()})
+
+    async def get_quiz(self) -> CompiledQuiz | None:
+        """
+        Returns the compiled quiz, or None if it was removed or changed since the session started.
+        """
+        quiz = await movie_quiz_catalog.get(self.quiz_id)
+        if quiz is None or quiz.version != self.version:
+            return None
+        return quiz
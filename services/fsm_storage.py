@@ -0,0 +1,240 @@
+# services/fsm_storage.py
+
+"""
+FSM storage backends selected by settings.fsm.storage.
+
+memory - aiogram in-process storage, conversations are lost on restart (default for local runs)
+redis  - shared between bot workers, every state has its own TTL so abandoned conversations expire
+sqlite - on-disk stand-in with the same TTL rules, for tests and single-host setups without Redis
+"""
+
+import asyncio
+import json
+import time
+from functools import partial
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+
+from core import logger, settings
+
+
+# Compact JSON: FSM data holds only short session cursors, no need for whitespace
+json_dumps = partial(json.dumps, separators=(",", ":"), ensure_ascii=False)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class StateTTL:
+    def __init__(self, default_ttl: int, state_ttls: dict[str, int]):
+        self.default_ttl = default_ttl
+        self.state_ttls = state_ttls
+
+    def __call__(self, state: Optional[str]) -> int:
+        return self.state_ttls.get(state, self.default_ttl)
+
+
+# SET that keeps the remaining TTL of the key, or gives a fresh key the default one.
+# A script instead of SET KEEPTTL and EXPIRE NX, which need Redis 6 and 7
+SET_KEEP_TTL = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    return redis.call('SET', KEYS[1], ARGV[1], 'PX', ttl)
+end
+return redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+"""
+
+
+class TTLRedisStorage(RedisStorage):
+    """
+    RedisStorage where the state and data keys of a conversation share the TTL of its current state.
+    """
+
+    def __init__(self, redis, ttl: StateTTL, **kwargs):
+        super().__init__(redis, state_ttl=ttl.default_ttl, data_ttl=ttl.default_ttl, json_dumps=json_dumps, **kwargs)
+        self.ttl = ttl
+        self._set_keep_ttl = redis.register_script(SET_KEEP_TTL)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_key = self.key_builder.build(key, "state")
+        data_key = self.key_builder.build(key, "data")
+        state = _state_name(state)
+        if state is None:
+            await self.redis.delete(state_key)
+            return
+
+        expire = self.ttl(state)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(state_key, state, ex=expire)
+            pipe.expire(data_key, expire)
+            await pipe.execute()
+
+    async def count_states(self) -> dict[str, int]:
+        # SCAN walks the whole keyspace, callers should not do this often
+        separator = self.key_builder.separator
+        pattern = f"{self.key_builder.prefix}{separator}*{separator}state"
+        counts: dict[str, int] = {}
+        keys = [key async for key in self.redis.scan_iter(match=pattern, count=1000)]
+        for start in range(0, len(keys), 1000):
+            for state in await self.redis.mget(keys[start:start + 1000]):
+                if state is not None:
+                    state = state.decode() if isinstance(state, bytes) else state
+                    counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        data_key = self.key_builder.build(key, "data")
+        if not data:
+            await self.redis.delete(data_key)
+            return
+
+        # Keep the TTL given by the current state, fresh keys get the default one
+        await self._set_keep_ttl(keys=[data_key], args=[self.json_dumps(data), self.ttl.default_ttl])
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a single SQLite file, with the same per-state TTL rules as the Redis backend.
+    """
+
+    purge_interval = 60
+
+    def __init__(self, path: str, ttl: StateTTL):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder()
+        self._db = None
+        # Concurrent first updates would each open (and leak) a connection
+        self._connect_lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    async def _connection(self):
+        if self._db is not None:
+            return self._db
+        async with self._connect_lock:
+            if self._db is None:
+                db = await aiosqlite.connect(self.path)
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS fsm_records ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                await db.commit()
+                # Published only once the table exists
+                self._db = db
+        return self._db
+
+    async def _purge_expired(self, db, now: float) -> None:
+        if now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            await db.execute("DELETE FROM fsm_records WHERE expires_at <= ?", (now,))
+
+    async def _get(self, key: str) -> Optional[str]:
+        db = await self._connection()
+        async with db.execute(
+            "SELECT value FROM fsm_records WHERE key = ? AND expires_at > ?", (key, time.time())
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db = await self._connection()
+        state_key = self.key_builder.build(key, "state")
+        state = _state_name(state)
+        now = time.time()
+
+        if state is None:
+            await db.execute("DELETE FROM fsm_records WHERE key = ?", (state_key,))
+        else:
+            expires_at = now + self.ttl(state)
+            await db.execute(
+                "INSERT OR REPLACE INTO fsm_records (key, value, expires_at) VALUES (?, ?, ?)",
+                (state_key, state, expires_at),
+            )
+            await db.execute(
+                "UPDATE fsm_records SET expires_at = ? WHERE key = ? AND expires_at > ?",
+                (expires_at, self.key_builder.build(key, "data"), now),
+            )
+        await self._purge_expired(db, now)
+        await db.commit()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._get(self.key_builder.build(key, "state"))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        db = await self._connection()
+        data_key = self.key_builder.build(key, "data")
+        now = time.time()
+
+        if not data:
+            await db.execute("DELETE FROM fsm_records WHERE key = ?", (data_key,))
+        else:
+            # Keep the expiry given by the current state, fresh records get the default TTL
+            await db.execute(
+                "INSERT INTO fsm_records (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = CASE "
+                "WHEN fsm_records.expires_at > ? THEN fsm_records.expires_at ELSE excluded.expires_at END",
+                (data_key, json_dumps(data), now + self.ttl.default_ttl, now),
+            )
+        await self._purge_expired(db, now)
+        await db.commit()
+
+    async def count_states(self) -> dict[str, int]:
+        db = await self._connection()
+        async with db.execute(
+            "SELECT value, COUNT(*) FROM fsm_records WHERE key LIKE '%:state' AND expires_at > ? GROUP BY value",
+            (time.time(),),
+        ) as cursor:
+            return dict(await cursor.fetchall())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self._get(self.key_builder.build(key, "data"))
+        return json.loads(value) if value else {}
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+def create_fsm_storage() -> BaseStorage:
+    ttl = StateTTL(settings.fsm.default_ttl, settings.fsm.state_ttls)
+
+    if settings.fsm.storage == "redis":
+        logger.info("Using Redis FSM storage")
+        return TTLRedisStorage.from_url(settings.fsm.redis_url, ttl=ttl)
+
+    if settings.fsm.storage == "sqlite":
+        logger.info(f"Using SQLite FSM storage at {settings.fsm.sqlite_path}")
+        return SQLiteStorage(settings.fsm.sqlite_path, ttl)
+
+    return MemoryStorage()
+
+
+async def count_states(storage: BaseStorage) -> dict[str, int]:
+    """
+    Number of conversations in every FSM state.
+    """
+    if isinstance(storage, (TTLRedisStorage, SQLiteStorage)):
+        return await storage.count_states()
+    if isinstance(storage, MemoryStorage):
+        counts: dict[str, int] = {}
+        for record in storage.storage.values():
+            if record.state is not None:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return counts
+    return {}
+
+
+def create_events_isolation(storage: BaseStorage) -> BaseEventIsolation | None:
+    """
+    Several bot workers share the Redis storage, so updates of one user are serialized with a Redis lock.
+    """
+    if isinstance(storage, RedisStorage):
+        return storage.create_isolation()
+    return None
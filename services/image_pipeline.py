@@ -0,0 +1,129 @@
+# services/image_pipeline.py
+
+"""
+Image pipeline for pictures uploaded through the admin panel.
+
+The original is stored as <sha256><ext>, the extension follows the format Pillow detects in the content, so duplicates are stored once and a name never points to
+different content. Two JPEG variants are generated next to it with Pillow:
+
+    <sha256>_tg.jpg     longest side <= telegram_max_side, sent to Telegram instead of the original
+    <sha256>_thumb.jpg  longest side <= thumbnail_max_side
+
+The upload itself is streamed to a staging file by the storage; everything here is blocking
+(decoding, encoding, disk writes), callers run it in a worker thread.
+"""
+
+import os
+import re
+
+from PIL import Image, ImageOps
+
+from core import settings
+from utils import FrozenSlots
+
+
+TELEGRAM_SUFFIX = "_tg.jpg"
+THUMBNAIL_SUFFIX = "_thumb.jpg"
+
+# Extension of the stored original by the format Pillow detects, other formats use their lowercased name
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "MPO": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp", "TIFF": ".tiff", "BMP": ".bmp"}
+
+_CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(_tg|_thumb)?\.[A-Za-z0-9]+$")
+
+
+class ImageVariant(FrozenSlots):
+    __slots__ = ("name", "width", "height", "size")
+
+
+class ProcessedImage(FrozenSlots):
+    __slots__ = ("sha256", "original", "telegram", "thumbnail")
+
+
+def telegram_variant(path: str) -> str:
+    """
+    Path of the Telegram variant of a stored picture, or the path itself for files stored before the pipeline.
+    """
+    stem, _ = os.path.splitext(path)
+    variant = stem + TELEGRAM_SUFFIX
+    return variant if os.path.isfile(variant) else path
+
+
+def is_content_addressed(name: str) -> bool:
+    """
+    True for names produced by the pipeline: their content never changes.
+    """
+    return bool(_CONTENT_ADDRESSED_NAME.match(name))
+
+
+def format_extension(image_format: str | None) -> str:
+    if not image_format:
+        raise ValueError("image format is unknown")
+    return FORMAT_EXTENSIONS.get(image_format, f".{image_format.lower()}")
+
+
+def variant_names(name: str) -> list[str]:
+    stem, _ = os.path.splitext(name)
+    return [name, stem + TELEGRAM_SUFFIX, stem + THUMBNAIL_SUFFIX]
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _save_variant(image: Image.Image, root_path: str, name: str, max_side: int) -> ImageVariant:
+    path = os.path.join(root_path, name)
+    variant = image.copy()
+    variant.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if not os.path.isfile(path):
+        _write_atomic(path, lambda f: variant.save(f, "JPEG", quality=settings.media.jpeg_quality, optimize=True, progressive=True))
+    return ImageVariant(name=name, width=variant.width, height=variant.height, size=os.path.getsize(path))
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def process_image(root_path: str, staged_path: str, sha256: str, filename: str) -> ProcessedImage:
+    """
+    Moves a fully written upload to its content-addressed name and generates its variants.
+    Files that already exist are not written again. Raises ValueError for content Pillow can not read.
+    """
+    try:
+        with Image.open(staged_path) as source:
+            source.load()
+            # The client controls the file name, the stored name only depends on the content
+            extension = format_extension(source.format)
+            width, height = source.size
+            image = _to_rgb(source)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        os.remove(staged_path)
+        raise ValueError(f"{filename} is not a valid image") from e
+
+    name, telegram_name, thumbnail_name = variant_names(sha256 + extension)
+
+    size = os.path.getsize(staged_path)
+    path = os.path.join(root_path, name)
+    if os.path.isfile(path):
+        os.remove(staged_path)
+    else:
+        os.replace(staged_path, path)
+
+    return ProcessedImage(
+        sha256=sha256,
+        original=ImageVariant(name=name, width=width, height=height, size=size),
+        telegram=_save_variant(image, root_path, telegram_name, settings.media.telegram_max_side),
+        thumbnail=_save_variant(image, root_path, thumbnail_name, settings.media.thumbnail_max_side),
+    )
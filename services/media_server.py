@@ -0,0 +1,184 @@
+# services/media_server.py
+
+"""
+Static serving of the media folders, tuned for Telegram fetches and admin previews.
+
+Pictures uploaded through the pipeline are named by the hash of their content, so their URLs are
+immutable: they get a strong ETag derived from the name and `Cache-Control: immutable` for a year.
+Older files named by the client get a strong ETag from size and mtime and are revalidated on every use.
+Conditional requests (If-None-Match, If-Modified-Since) are answered with 304, single byte ranges
+(with If-Range) with 206. The body goes out through the zero-copy send extension when the ASGI server
+offers one, otherwise it is read in chunks in a worker thread.
+"""
+
+import os
+from email.utils import formatdate, parsedate
+from mimetypes import guess_type
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+from .image_pipeline import is_content_addressed
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def _etag(name: str, stat_result: os.stat_result) -> str:
+    if is_content_addressed(name):
+        return f'"{os.path.splitext(name)[0]}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(etag: str, header: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single "bytes=" range into (offset, length). Returns None when the header can not be
+    honoured as one range (the whole file is sent then), raises ValueError when it is unsatisfiable.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, dash, end = ranges.strip().partition("-")
+    try:
+        first = int(start) if start else None
+        last = int(end) if end else None
+    except ValueError:
+        return None
+    if not dash or (first is None and last is None):
+        return None
+
+    if first is None:
+        # Suffix range: the last N bytes
+        if last == 0 or size == 0:
+            raise ValueError(header)
+        length = min(last, size)
+        return size - length, length
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise ValueError(header)
+    last = size - 1 if last is None else min(last, size - 1)
+    return first, last - first + 1
+
+
+class MediaFileResponse(Response):
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, headers: dict, status_code: int = 200, offset: int = 0, length: int = 0):
+        self.path = path
+        self.status_code = status_code
+        self.offset = offset
+        self.length = length
+        self.media_type = guess_type(path)[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers({**headers, "content-length": str(length)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # The file was truncated while it was being sent
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class MediaStaticFiles(StaticFiles):
+    def lookup_path(self, path: str):
+        # Staging files of uploads in progress are never served
+        if os.path.basename(path).startswith("."):
+            return "", None
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        size = stat_result.st_size
+        etag = _etag(name, stat_result)
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+        headers = {
+            "etag": etag,
+            "last-modified": last_modified,
+            "cache-control": IMMUTABLE_CACHE_CONTROL if is_content_addressed(name) else REVALIDATE_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        }
+
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if range_header and self._if_range_matches(request_headers.get("if-range"), etag, stat_result):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+        if byte_range is None:
+            return MediaFileResponse(full_path, headers, status_code, 0, size)
+
+        offset, length = byte_range
+        headers["content-range"] = f"bytes {offset}-{offset + length - 1}/{size}"
+        return MediaFileResponse(full_path, headers, 206, offset, length)
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # If-Modified-Since is only looked at when the client sent no ETags
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(response_headers["etag"], if_none_match, weak=True)
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is not None:
+            since = parsedate(if_modified_since)
+            last_modified = parsedate(response_headers["last-modified"])
+            return since is not None and last_modified is not None and since >= last_modified
+        return False
+
+    @staticmethod
+    def _if_range_matches(if_range: str | None, etag: str, stat_result: os.stat_result) -> bool:
+        if if_range is None:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # If-Range needs a strong comparison
+            return _etag_matches(etag, if_range, weak=False)
+        return if_range == formatdate(stat_result.st_mtime, usegmt=True)
@@ -0,0 +1,104 @@
+# services/message_render.py
+
+"""
+Render-diff layer for the messages the bot keeps editing in place (test questions and results).
+
+For every rendered message the last state is remembered: the picture, a hash of the text or caption
+and a hash of the inline keyboard. The next render of the same message compares the new state with it
+and makes the cheapest call that gets there:
+
+    nothing changed          -> no request at all
+    only the keyboard        -> edit_reply_markup
+    text / caption changed   -> edit_caption or edit_text (with the keyboard in the same request)
+    picture changed, unknown -> edit_media / edit_text, as before
+
+So a test with a picture no longer re-sends the photo on every question. Telegram's
+"message is not modified" answer is treated as success instead of an error.
+The state is kept in process memory; a message this worker has not rendered yet gets a full edit.
+"""
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from core import logger
+from utils import TTLCache, MISSING
+
+from .telegram_media import answer_photo, edit_photo
+
+
+RENDER_CACHE_SIZE = 10000
+RENDER_CACHE_TTL = 24 * 60 * 60
+
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in str(error)
+
+
+class MessageRenderer:
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE, ttl: float = RENDER_CACHE_TTL):
+        # (chat id, message id) -> (picture, text hash, keyboard hash)
+        self._states = TTLCache(maxsize, ttl)
+
+    @staticmethod
+    def _key(message: types.Message) -> tuple[int, int]:
+        return message.chat.id, message.message_id
+
+    @staticmethod
+    def _state(text: str, picture: str | None, reply_markup) -> tuple:
+        markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup is not None else None
+        return picture, hash(text), hash(markup)
+
+    def _remember(self, message, state: tuple) -> None:
+        if isinstance(message, types.Message):
+            self._states.set(self._key(message), state)
+
+    def forget(self, message: types.Message) -> None:
+        self._states.pop(self._key(message))
+
+    async def send(self, message: types.Message, text: str, picture: str | None = None, reply_markup=None):
+        """
+        Sends a new message to the chat of `message` and remembers what was rendered in it.
+        """
+        if picture:
+            sent = await answer_photo(message, picture, text, reply_markup=reply_markup)
+        else:
+            sent = await message.answer(text=text, reply_markup=reply_markup)
+        self._remember(sent, self._state(text, picture, reply_markup))
+        return sent
+
+    async def show(self, message: types.Message, text: str, picture: str | None = None, reply_markup=None):
+        """
+        Edits `message` in place to show the text, picture and keyboard, using the cheapest request.
+        """
+        key = self._key(message)
+        new_state = self._state(text, picture, reply_markup)
+        old_state = self._states.get(key)
+
+        if old_state == new_state:
+            return message
+
+        try:
+            if old_state is MISSING or old_state[0] != picture:
+                if picture:
+                    result = await edit_photo(message, picture, text, reply_markup=reply_markup)
+                else:
+                    result = await message.edit_text(text=text, reply_markup=reply_markup)
+            elif old_state[1] != new_state[1]:
+                if picture:
+                    result = await message.edit_caption(caption=text, reply_markup=reply_markup)
+                else:
+                    result = await message.edit_text(text=text, reply_markup=reply_markup)
+            else:
+                result = await message.edit_reply_markup(reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if not _is_not_modified(e):
+                self._states.pop(key)
+                raise
+            logger.debug(f"Message {key} is already up to date")
+            result = message
+
+        self._states.set(key, new_state)
+        return result
+
+
+message_renderer = MessageRenderer()
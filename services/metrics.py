@@ -0,0 +1,142 @@
+# services/metrics.py
+
+"""
+Runtime metrics of the bot worker, served by GET /metrics.
+
+    bot_handler_duration_seconds       time spent in every handler, by handler (module.name) and event type
+    bot_handler_errors_total           handlers that raised, by handler and exception
+    bot_api_request_duration_seconds   Bot API calls, by method
+    bot_api_errors_total               failed Bot API calls, by method and exception
+    db_pool_*                          connections of every database pool
+    fsm_sessions                       conversations in every FSM state
+    broadcast_deliveries_total         broadcast recipients handled, by result
+
+Everything is kept per process, with several workers every worker is scraped on its own.
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.types import TelegramObject
+
+from core import logger
+from core.models import engine_registry
+from utils import MetricsRegistry
+from .fsm_storage import count_states
+
+
+# FSM states are counted at most this often, a count walks the whole storage
+FSM_SESSIONS_REFRESH_INTERVAL = 30.0
+
+metrics = MetricsRegistry()
+
+handler_duration = metrics.histogram(
+    "bot_handler_duration_seconds", "Time spent in bot handlers", ("handler", "event"),
+)
+handler_errors = metrics.counter(
+    "bot_handler_errors_total", "Bot handlers that raised an exception", ("handler", "error"),
+)
+api_request_duration = metrics.histogram(
+    "bot_api_request_duration_seconds", "Bot API request latency", ("method",),
+)
+api_errors = metrics.counter(
+    "bot_api_errors_total", "Failed Bot API requests", ("method", "error"),
+)
+pool_size = metrics.gauge("db_pool_size", "Connections kept open by the pool", ("pool",))
+pool_checked_out = metrics.gauge("db_pool_checked_out", "Connections in use", ("pool",))
+pool_overflow = metrics.gauge("db_pool_overflow", "Connections opened beyond pool_size", ("pool",))
+pool_max_connections = metrics.gauge("db_pool_max_connections", "Connections the pool may open", ("pool",))
+fsm_sessions = metrics.gauge("fsm_sessions", "Conversations in an FSM state", ("state",))
+broadcast_deliveries = metrics.counter(
+    "broadcast_deliveries_total", "Broadcast recipients handled", ("result",),
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware, so it knows the handler that matched the event.
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+
+    @staticmethod
+    def handler_name(handler_object) -> str:
+        # Qualified by the module, several routers have a process_answer or end_test
+        callback = getattr(handler_object, "callback", None)
+        if callback is None:
+            return "unknown"
+        module = getattr(callback, "__module__", None)
+        name = getattr(callback, "__qualname__", None) or getattr(callback, "__name__", "unknown")
+        return f"{module}.{name}" if module else name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = self.handler_name(data.get("handler"))
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            handler_errors.inc(name, e.__class__.__name__)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started_at, name, self.event)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method):
+        name = method.__api_method__
+        started_at = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(name, e.__class__.__name__)
+            raise
+        finally:
+            api_request_duration.observe(time.perf_counter() - started_at, name)
+
+
+def setup_bot_metrics(bot, dp) -> None:
+    """
+    Times every handler of the dispatcher and every Bot API call of the bot.
+    """
+    for event in dp.resolve_used_update_types():
+        dp.observers[event].middleware(HandlerMetricsMiddleware(event))
+    bot.session.middleware(BotApiMetricsMiddleware())
+    fsm_collector.storage = dp.storage
+
+
+@metrics.collector
+def collect_pools() -> None:
+    for name, stats in engine_registry.stats().items():
+        pool_size.set(stats["size"], name)
+        pool_checked_out.set(stats["checked_out"], name)
+        pool_overflow.set(stats["overflow"], name)
+        pool_max_connections.set(stats["max_connections"], name)
+
+
+class FSMSessionsCollector:
+    def __init__(self):
+        self.storage: BaseStorage | None = None
+        self._refreshed_at = 0.0
+
+    async def __call__(self) -> None:
+        if self.storage is None or time.monotonic() - self._refreshed_at < FSM_SESSIONS_REFRESH_INTERVAL:
+            return
+        self._refreshed_at = time.monotonic()
+        try:
+            counts = await count_states(self.storage)
+        except Exception as e:
+            logger.exception(f"Error in FSMSessionsCollector: {e}")
+            return
+        fsm_sessions.replace({(state,): count for state, count in counts.items()})
+
+
+fsm_collector = metrics.collector(FSMSessionsCollector())
@@ -0,0 +1,213 @@
+# services/movie_quiz_catalog.py
+
+"""
+In-process catalog of compiled movie quizzes.
+
+A quiz is compiled into its metadata and the array of its active question ids, which is all a session
+needs to draw its questions. A question is loaded together with its answers only when it is shown,
+compiled once and kept in a bounded cache shared by all players. The admin panel invalidates both.
+"""
+
+import asyncio
+import uuid
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from core import logger, settings
+from core.models import db_helper
+from utils import FrozenSlots, TTLCache, MISSING
+
+
+class CompiledQuizAnswer(FrozenSlots):
+    __slots__ = ("id", "text", "is_correct")
+
+
+class CompiledQuizQuestion(FrozenSlots):
+    __slots__ = ("id", "text", "interesting_fact", "picture", "answers", "correct_answer")
+
+
+class CompiledQuiz(FrozenSlots):
+    __slots__ = ("id", "title", "description", "picture", "question_ids", "version")
+
+    def __repr__(self):
+        return f"<CompiledQuiz(id={self.id}, title={self.title}, questions={len(self.question_ids)}, version={self.version})>"
+
+
+def compile_quiz(quiz: "MovieQuiz", question_ids: tuple[uuid.UUID, ...]) -> CompiledQuiz:
+    # Fingerprint of what a running session relies on: the question ids its sample is drawn from
+    version = zlib.crc32(",".join(str(question_id) for question_id in question_ids).encode())
+    return CompiledQuiz(
+        id=quiz.id,
+        title=quiz.title,
+        description=quiz.description,
+        picture=str(quiz.picture) if quiz.picture else None,
+        question_ids=question_ids,
+        version=version,
+    )
+
+
+def compile_question(question: "MovieQuizQuestion") -> CompiledQuizQuestion:
+    answers = tuple(
+        CompiledQuizAnswer(id=answer.id, text=answer.answer_text, is_correct=bool(answer.is_correct))
+        for answer in sorted(question.answers, key=lambda answer: (answer.created_at, answer.id))
+        if answer.is_active
+    )
+    return CompiledQuizQuestion(
+        id=question.id,
+        text=question.question_text,
+        interesting_fact=question.interesting_fact,
+        picture=str(question.picture) if question.picture else None,
+        answers=answers,
+        correct_answer=next((answer for answer in answers if answer.is_correct), None),
+    )
+
+
+class QuizListing(FrozenSlots):
+    __slots__ = ("id", "title", "description")
+
+
+class MovieQuizCatalog:
+    def __init__(self):
+        self._quizzes: dict[uuid.UUID, CompiledQuiz] = {}
+        # Active quizzes for the /start_quiz browser, None until first requested
+        self._listing: tuple[QuizListing, ...] | None = None
+        self._questions = TTLCache(settings.movie_quiz.question_cache_size, settings.movie_quiz.question_cache_ttl)
+        # Cold loads in flight, the listing and every quiz id have their own,
+        # so concurrent requests share a load and different loads do not wait for each other
+        self._listing_task: asyncio.Task | None = None
+        self._loading: dict[uuid.UUID, asyncio.Task] = {}
+        self.generation = 0
+
+    async def listing(self) -> tuple[QuizListing, ...] | None:
+        """
+        Active quizzes, newest first. Returns None when the list could not be loaded.
+        """
+        listing = self._listing
+        if listing is not None:
+            return listing
+
+        task = self._listing_task
+        if task is None:
+            task = self._listing_task = asyncio.create_task(self._load_listing())
+            task.add_done_callback(self._listing_done)
+        # A cancelled caller does not cancel the load the others wait for
+        return await asyncio.shield(task)
+
+    def _listing_done(self, task: asyncio.Task) -> None:
+        # After an invalidation the slot may already belong to a newer load
+        if self._listing_task is task:
+            self._listing_task = None
+
+    async def _load_listing(self) -> tuple[QuizListing, ...] | None:
+        from core.models.movie_quiz import MovieQuiz
+        generation = self.generation
+        async with db_helper.session_factory() as session:
+            try:
+                result = await session.execute(
+                    select(MovieQuiz.id, MovieQuiz.title, MovieQuiz.description)
+                    .where(MovieQuiz.is_active == True)
+                    .order_by(MovieQuiz.created_at.desc())
+                )
+            except Exception as e:
+                logger.exception(f"Error in MovieQuizCatalog._load_listing: {e}")
+                return None
+            listing = tuple(
+                QuizListing(id=quiz_id, title=title, description=description)
+                for quiz_id, title, description in result.all()
+            )
+
+        # Invalidated while loading: serve this result once, the next call reloads
+        if generation == self.generation:
+            self._listing = listing
+        return listing
+
+    async def get(self, quiz_id: uuid.UUID | str) -> CompiledQuiz | None:
+        try:
+            quiz_id = quiz_id if isinstance(quiz_id, uuid.UUID) else uuid.UUID(str(quiz_id))
+        except ValueError:
+            return None
+
+        compiled = self._quizzes.get(quiz_id)
+        if compiled is not None:
+            return compiled
+
+        task = self._loading.get(quiz_id)
+        if task is None:
+            task = asyncio.create_task(self._load(quiz_id))
+            self._loading[quiz_id] = task
+            task.add_done_callback(lambda done: self._load_done(quiz_id, done))
+        return await asyncio.shield(task)
+
+    def _load_done(self, quiz_id: uuid.UUID, task: asyncio.Task) -> None:
+        if self._loading.get(quiz_id) is task:
+            del self._loading[quiz_id]
+
+    async def _load(self, quiz_id: uuid.UUID) -> CompiledQuiz | None:
+        # Imported here because core.models imports services for the file storages
+        from core.models.movie_quiz import MovieQuiz, MovieQuizQuestion
+        generation = self.generation
+        async with db_helper.session_factory() as session:
+            try:
+                result = await session.execute(MovieQuiz.active().where(MovieQuiz.id == quiz_id))
+                quiz = result.scalar_one_or_none()
+                if quiz is None:
+                    return None
+
+                result = await session.execute(
+                    select(MovieQuizQuestion.id)
+                    .where(MovieQuizQuestion.quiz_id == quiz_id, MovieQuizQuestion.is_active == True)
+                    .order_by(MovieQuizQuestion.created_at, MovieQuizQuestion.id)
+                )
+                question_ids = tuple(result.scalars().all())
+            except Exception as e:
+                logger.exception(f"Error in MovieQuizCatalog._load: {e}")
+                return None
+
+        compiled = compile_quiz(quiz, question_ids)
+        # Do not cache a quiz that was read while the catalog was being invalidated
+        if generation == self.generation:
+            self._quizzes[quiz_id] = compiled
+        return compiled
+
+    async def get_question(self, quiz: CompiledQuiz, question_id: uuid.UUID) -> CompiledQuizQuestion | None:
+        """
+        The question of the quiz with its active answers, loaded on first use.
+        Returns None when it is no longer active or could not be loaded.
+        """
+        compiled = self._questions.get(question_id)
+        if compiled is not MISSING:
+            return compiled
+
+        from core.models.movie_quiz import MovieQuizQuestion
+        generation = self.generation
+        async with db_helper.session_factory() as session:
+            try:
+                result = await session.execute(
+                    MovieQuizQuestion.active()
+                    .options(selectinload(MovieQuizQuestion.answers))
+                    .where(MovieQuizQuestion.id == question_id, MovieQuizQuestion.quiz_id == quiz.id)
+                )
+                question = result.scalar_one_or_none()
+            except Exception as e:
+                logger.exception(f"Error in MovieQuizCatalog.get_question: {e}")
+                return None
+
+        compiled = compile_question(question) if question is not None else None
+        if generation == self.generation:
+            self._questions.set(question_id, compiled)
+        return compiled
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self._quizzes.clear()
+        self._questions.clear()
+        self._listing = None
+        # Loads started before are not cached, the next request starts a fresh one
+        self._listing_task = None
+        self._loading.clear()
+        logger.info(f"Movie quiz catalog invalidated (generation {self.generation})")
+
+
+movie_quiz_catalog = MovieQuizCatalog()
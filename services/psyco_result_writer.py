@@ -0,0 +1,118 @@
+# services/psyco_result_writer.py
+
+"""
+Buffered writer of completed psyco test runs.
+
+end_test only appends a row to an in-memory buffer, a background task writes the buffer
+with one multi-row INSERT every flush interval (or as soon as a batch is full).
+Rows that could not be written are kept for the next flush, up to settings.results.max_pending.
+"""
+
+import asyncio
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from core import logger, settings
+from core.models import background_db_helper
+from core.models.psyco_test_result import PsycoTestResult
+
+
+class PsycoResultWriter:
+    def __init__(self):
+        self._pending: list[dict] = []
+        self._flush_task: asyncio.Task | None = None
+        # Flushes started for a full batch, keep references so the tasks are not garbage collected
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    def record(self, chat_id: int, session, test, result) -> None:
+        self._pending.append({
+            "chat_id": chat_id,
+            "test_id": test.id,
+            "test_version": test.version,
+            "sent_test_id": session.sent_test_id,
+            "score": session.score,
+            "answers": session.answers.tolist(),
+            "result_text": result.text if result else None,
+        })
+
+        if len(self._pending) >= settings.results.batch_size:
+            task = asyncio.create_task(self.flush())
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(settings.results.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        # One flush at a time, so failed rows are put back in order
+        async with self._lock:
+            while self._pending:
+                rows = self._pending[:settings.results.batch_size]
+                del self._pending[:len(rows)]
+                async with background_db_helper.session_factory() as session:
+                    try:
+                        await session.execute(insert(PsycoTestResult.__table__).values(rows))
+                        await session.commit()
+                        continue
+                    except IntegrityError:
+                        # E.g. a sent test deleted in the meantime, do not let one row block the batch
+                        await session.rollback()
+                    except Exception as e:
+                        logger.exception(f"Error in PsycoResultWriter.flush ({len(rows)} results): {e}")
+                        await session.rollback()
+                        self._retry_later(rows)
+                        return
+
+                unsaved = await self._write_one_by_one(rows)
+                if unsaved:
+                    self._retry_later(unsaved)
+                    return
+
+    def _retry_later(self, rows: list[dict]) -> None:
+        self._pending[:0] = rows
+        dropped = len(self._pending) - settings.results.max_pending
+        if dropped > 0:
+            for row in self._pending[:dropped]:
+                logger.error(f"Dropped test result of chat {row['chat_id']} that could not be saved")
+            del self._pending[:dropped]
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    @staticmethod
+    async def _write_one_by_one(rows: list[dict]) -> list[dict]:
+        """
+        Writes the rows one at a time, rows that violate a constraint are dropped.
+        Returns the rows left unsaved by any other error, starting with the failed one.
+        """
+        async with background_db_helper.session_factory() as session:
+            for number, row in enumerate(rows):
+                try:
+                    await session.execute(insert(PsycoTestResult.__table__).values(row))
+                    await session.commit()
+                except IntegrityError as e:
+                    await session.rollback()
+                    logger.error(f"Dropped test result of chat {row['chat_id']}: {e}")
+                except Exception as e:
+                    logger.exception(f"Error in PsycoResultWriter._write_one_by_one ({len(rows) - number} results): {e}")
+                    await session.rollback()
+                    return rows[number:]
+        return []
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._flush_task is not None:
+            # The last flush failed, there is no later one
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._pending:
+            logger.error(f"Dropped {len(self._pending)} test results that could not be saved")
+            self._pending.clear()
+
+
+psyco_result_writer = PsycoResultWriter()
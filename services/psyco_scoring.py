@@ -0,0 +1,96 @@
+# services/psyco_scoring.py
+
+"""
+Scoring engine shared by the psyco test handlers.
+
+Every compiled test carries a hash map from option id to (question index, option index, score)
+and a sorted table of result bands, so an answer is resolved in O(1) and a result in O(log n).
+Band tables are validated when the test is compiled: overlapping, inverted or non-adjacent bands
+make the test unavailable instead of giving a wrong or missing interpretation at the end.
+"""
+
+from bisect import bisect_right
+
+from utils import FrozenSlots
+
+
+class InvalidResultBands(ValueError):
+    pass
+
+
+class OptionRef(FrozenSlots):
+    __slots__ = ("question_index", "option_index", "score")
+
+
+class ResultTable(FrozenSlots):
+    """
+    Result bands sorted by min_score. Scores are integers, so adjacent bands are [a, b] and [b + 1, c].
+    """
+    __slots__ = ("bands", "starts")
+
+    @classmethod
+    def build(cls, results) -> "ResultTable":
+        bands = tuple(sorted(results, key=lambda r: (r.min_score, r.max_score)))
+        previous = None
+        for band in bands:
+            if band.min_score > band.max_score:
+                raise InvalidResultBands(f"Result band [{band.min_score}, {band.max_score}] is inverted")
+            if previous is not None:
+                if band.min_score <= previous.max_score:
+                    raise InvalidResultBands(
+                        f"Result bands [{previous.min_score}, {previous.max_score}] and "
+                        f"[{band.min_score}, {band.max_score}] overlap"
+                    )
+                if band.min_score > previous.max_score + 1:
+                    raise InvalidResultBands(
+                        f"Scores {previous.max_score + 1}..{band.min_score - 1} are not covered by any result"
+                    )
+            previous = band
+        return cls(bands=bands, starts=tuple(band.min_score for band in bands))
+
+    def find(self, score: int):
+        position = bisect_right(self.starts, score) - 1
+        if position < 0:
+            return None
+        band = self.bands[position]
+        return band if score <= band.max_score else None
+
+    def __iter__(self):
+        return iter(self.bands)
+
+    def __len__(self):
+        return len(self.bands)
+
+
+def build_option_map(questions) -> dict[str, OptionRef]:
+    # Keys are the option ids as they come back in callback data
+    return {
+        str(option.id): OptionRef(question_index=question_index, option_index=option_index, score=option.score)
+        for question_index, question in enumerate(questions)
+        for option_index, option in enumerate(question.options)
+    }
+
+
+def apply_answer(session, test, option_id: str) -> bool:
+    """
+    Records the chosen option for the current question. Returns False for an unknown option
+    or a button left over from another question.
+    """
+    ref = test.option_map.get(option_id)
+    if ref is None or ref.question_index != session.index:
+        return False
+    session.answers.append(ref.option_index)
+    session.score += ref.score
+    return True
+
+
+def revert_answer(session, test) -> bool:
+    if not session.answers:
+        return False
+    option_index = session.answers.pop()
+    session.score -= test.questions[session.index].options[option_index].score
+    return True
+
+
+def chosen_options(session, test) -> list:
+    return [test.questions[i].options[option_index] for i, option_index in enumerate(session.answers)]
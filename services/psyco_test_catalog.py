@@ -0,0 +1,154 @@
+# services/psyco_test_catalog.py
+
+"""
+In-process catalog of compiled psychological tests.
+
+Each active PsycoTest is loaded from the database once (questions, answer options and results)
+and compiled into small immutable objects, so starting or answering a test does not hit the database.
+The catalog is invalidated from the admin panel whenever tests, questions, answers or results change.
+"""
+
+import asyncio
+import uuid
+import zlib
+
+from sqlalchemy.orm import selectinload
+
+from core import logger
+from core.models import db_helper
+from utils import FrozenSlots
+from .psyco_scoring import InvalidResultBands, ResultTable, build_option_map
+
+
+class CompiledOption(FrozenSlots):
+    __slots__ = ("id", "text", "score")
+
+
+class CompiledQuestion(FrozenSlots):
+    __slots__ = ("id", "text", "options")
+
+
+class CompiledResult(FrozenSlots):
+    __slots__ = ("min_score", "max_score", "text")
+
+
+class CompiledTest(FrozenSlots):
+    __slots__ = ("id", "name", "description", "picture", "allow_back", "questions", "option_map", "results", "version")
+
+    def __repr__(self):
+        return f"<CompiledTest(id={self.id}, name={self.name}, version={self.version})>"
+
+
+def _ordered(rows):
+    # Explicit order of questions and options, the relationships are loaded in it too
+    return sorted(rows, key=lambda row: (row.position, row.created_at))
+
+
+def compile_test(test: "PsycoTest") -> CompiledTest:
+    questions = tuple(
+        CompiledQuestion(
+            id=question.id,
+            text=question.question_text,
+            options=tuple(
+                CompiledOption(id=option.id, text=option.answer.answer_text, score=option.score_value or 0)
+                for option in _ordered(question.answer_options)
+                if option.is_active
+            ),
+        )
+        for question in _ordered(test.questions)
+        if question.is_active
+    )
+    # Raises InvalidResultBands for overlapping or non-adjacent result bands
+    results = ResultTable.build(
+        CompiledResult(min_score=result.min_score, max_score=result.max_score, text=result.text)
+        for result in test.results
+        if result.is_active
+    )
+    # Fingerprint of everything a running session relies on (question order, option order and scores)
+    version = zlib.crc32(repr(tuple(
+        (str(question.id), tuple((str(option.id), option.score) for option in question.options))
+        for question in questions
+    )).encode())
+    return CompiledTest(
+        id=test.id,
+        name=test.name,
+        description=test.description,
+        picture=str(test.picture) if test.picture else None,
+        allow_back=bool(test.allow_back),
+        questions=questions,
+        option_map=build_option_map(questions),
+        results=results,
+        version=version,
+    )
+
+
+class PsycoTestCatalog:
+    def __init__(self):
+        self._tests: dict[uuid.UUID, CompiledTest] = {}
+        # Cold loads in flight by test id: concurrent requests for one test share a load,
+        # loads of different tests do not wait for each other
+        self._loading: dict[uuid.UUID, asyncio.Task] = {}
+        self.generation = 0
+
+    async def get(self, test_id: uuid.UUID | str) -> CompiledTest | None:
+        try:
+            test_id = test_id if isinstance(test_id, uuid.UUID) else uuid.UUID(str(test_id))
+        except ValueError:
+            return None
+
+        compiled = self._tests.get(test_id)
+        if compiled is not None:
+            return compiled
+
+        task = self._loading.get(test_id)
+        if task is None:
+            task = asyncio.create_task(self._load(test_id))
+            self._loading[test_id] = task
+            task.add_done_callback(lambda done: self._load_done(test_id, done))
+        # A cancelled caller does not cancel the load the others wait for
+        return await asyncio.shield(task)
+
+    def _load_done(self, test_id: uuid.UUID, task: asyncio.Task) -> None:
+        # After an invalidation the entry may already belong to a newer load
+        if self._loading.get(test_id) is task:
+            del self._loading[test_id]
+
+    async def _load(self, test_id: uuid.UUID) -> CompiledTest | None:
+        # Imported here because core.models imports services for the file storages
+        from core.models.psyco_test import PsycoTest, PsycoQuestion, PsycoQuestionAnswer
+        generation = self.generation
+        async with db_helper.session_factory() as session:
+            try:
+                stmt = PsycoTest.active().options(
+                    selectinload(PsycoTest.questions).selectinload(PsycoQuestion.answer_options).selectinload(PsycoQuestionAnswer.answer),
+                    selectinload(PsycoTest.results)
+                ).where(PsycoTest.id == test_id)
+                result = await session.execute(stmt)
+                test = result.scalar_one_or_none()
+            except Exception as e:
+                logger.exception(f"Error in PsycoTestCatalog._load: {e}")
+                return None
+
+        if test is None:
+            return None
+
+        try:
+            compiled = compile_test(test)
+        except InvalidResultBands as e:
+            logger.error(f"Psyco test {test_id} is not available: {e}")
+            return None
+
+        # Do not cache a graph that was read while the catalog was being invalidated
+        if generation == self.generation:
+            self._tests[test_id] = compiled
+        return compiled
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self._tests.clear()
+        # Loads started before are not cached, the next request starts a fresh one
+        self._loading.clear()
+        logger.info(f"Psyco test catalog invalidated (generation {self.generation})")
+
+
+psyco_test_catalog = PsycoTestCatalog()
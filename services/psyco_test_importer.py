@@ -0,0 +1,431 @@
+# services/psyco_test_importer.py
+
+"""
+Importer of declarative psyco test packages.
+
+A package is a YAML (or JSON) file in psyco_tests_data, the file name without the extension is its name:
+
+    name: Шкала тревожности Бека
+    description: ...
+    allow_back: true
+    options:                    # options of every question that has none of its own
+      - {text: симптом совсем не беспокоил, score: 0}
+      - {text: слегка, не слишком меня беспокоил, score: 1}
+    questions:
+      - Ощущение жары           # a plain string uses the package options
+      - text: Дрожь в ногах
+        options: [{text: Нет, score: 0}, {text: Да, score: 1}]
+    results:
+      - {min_score: 0, max_score: 21, text: Незначительный уровень тревоги}
+
+All packages are validated first, then imported in one transaction with multi-row inserts: the tests
+are upserted by package name, answer texts are looked up in one query and the missing ones inserted
+in one statement. A package whose content hash matches the stored one is skipped. Workers that seed at the
+same time take turns on an advisory lock, so a package is never imported twice. Tests created by the
+former CSV loaders are adopted by name. With --dry-run nothing is written, only the report is printed.
+
+    python services/psyco_test_importer.py [--dry-run] [path ...]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import uuid
+from pathlib import Path
+
+import yaml
+from sqlalchemy import any_, bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core import logger
+from core.models import background_db_helper
+from core.models import (
+    PsycoTest,
+    PsycoQuestion,
+    PsycoAnswer,
+    PsycoQuestionAnswer,
+    PsycoResult
+)
+from utils import FrozenSlots
+from services.psyco_scoring import InvalidResultBands, ResultTable
+from services.psyco_test_catalog import psyco_test_catalog
+
+
+PACKAGES_DIR = Path(__file__).parent.parent / "psyco_tests_data"
+PACKAGE_SUFFIXES = (".yaml", ".yml", ".json")
+
+# Rows per INSERT, keeps every statement well below the bind parameter limit of asyncpg
+INSERT_CHUNK_SIZE = 1000
+# Key of the transaction level advisory lock that lets only one worker import at a time
+IMPORT_LOCK_KEY = 0x70737963
+
+
+class InvalidTestPackage(ValueError):
+    def __init__(self, problems: list[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+class PackageOption(FrozenSlots):
+    __slots__ = ("text", "score")
+
+
+class PackageQuestion(FrozenSlots):
+    __slots__ = ("text", "options")
+
+
+class PackageResult(FrozenSlots):
+    __slots__ = ("min_score", "max_score", "text")
+
+
+class TestPackage(FrozenSlots):
+    __slots__ = ("name", "path", "title", "description", "allow_back", "questions", "results", "content_hash")
+
+    @property
+    def answer_texts(self) -> set[str]:
+        return {option.text for question in self.questions for option in question.options}
+
+
+class ImportReport(FrozenSlots):
+    """
+    What the importer did (or would do with --dry-run) with one package.
+    """
+    __slots__ = ("package", "status", "questions", "options", "results", "problems")
+
+    def __str__(self):
+        line = f"{self.package}: {self.status}"
+        if self.questions:
+            line += f" ({self.questions} questions, {self.options} options, {self.results} results)"
+        if self.problems:
+            line += "".join(f"\n    - {problem}" for problem in self.problems)
+        return line
+
+
+def _text(value, where: str, problems: list[str]) -> str:
+    if not isinstance(value, str) or not value.strip():
+        problems.append(f"{where}: text is missing")
+        return ""
+    return value.strip()
+
+
+def _score(value, where: str, problems: list[str]) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        problems.append(f"{where}: score must be an integer, got {value!r}")
+        return 0
+    return value
+
+
+def _parse_options(raw, where: str, problems: list[str]) -> tuple[PackageOption, ...]:
+    if not isinstance(raw, list) or len(raw) < 2:
+        problems.append(f"{where}: at least two options are required")
+        return ()
+    options = []
+    for number, item in enumerate(raw, start=1):
+        item = item if isinstance(item, dict) else {}
+        options.append(PackageOption(
+            text=_text(item.get("text"), f"{where}, option {number}", problems),
+            score=_score(item.get("score"), f"{where}, option {number}", problems),
+        ))
+    texts = [option.text for option in options]
+    if len(set(texts)) != len(texts):
+        problems.append(f"{where}: option texts repeat")
+    return tuple(options)
+
+
+def parse_package(path: Path) -> TestPackage:
+    """
+    Reads and validates a package. Raises InvalidTestPackage with every problem found.
+    """
+    try:
+        raw = yaml.safe_load(path.read_text(encoding="utf-8"))
+    except (OSError, yaml.YAMLError) as e:
+        raise InvalidTestPackage([f"can not be read: {e}"])
+    if not isinstance(raw, dict):
+        raise InvalidTestPackage(["must be a mapping with name, questions and results"])
+
+    problems = []
+    title = _text(raw.get("name"), "name", problems)
+    description = raw.get("description") or ""
+    allow_back = raw.get("allow_back", True)
+    if not isinstance(allow_back, bool):
+        problems.append("allow_back must be true or false")
+
+    default_options = None
+    if raw.get("options") is not None:
+        default_options = _parse_options(raw["options"], "options", problems)
+
+    questions = []
+    raw_questions = raw.get("questions")
+    if not isinstance(raw_questions, list) or not raw_questions:
+        problems.append("questions: at least one question is required")
+        raw_questions = []
+    for number, item in enumerate(raw_questions, start=1):
+        where = f"question {number}"
+        item = {"text": item} if isinstance(item, str) else item if isinstance(item, dict) else {}
+        if item.get("options") is not None:
+            options = _parse_options(item["options"], where, problems)
+        elif default_options is not None:
+            options = default_options
+        else:
+            problems.append(f"{where}: has no options and the package has no default options")
+            options = ()
+        questions.append(PackageQuestion(text=_text(item.get("text"), where, problems), options=options))
+
+    results = []
+    raw_results = raw.get("results")
+    if not isinstance(raw_results, list) or not raw_results:
+        problems.append("results: at least one result is required")
+        raw_results = []
+    for number, item in enumerate(raw_results, start=1):
+        where = f"result {number}"
+        item = item if isinstance(item, dict) else {}
+        results.append(PackageResult(
+            min_score=_score(item.get("min_score"), where, problems),
+            max_score=_score(item.get("max_score"), where, problems),
+            text=_text(item.get("text"), where, problems),
+        ))
+
+    if results:
+        # The same checks the catalog runs before a test is shown
+        valid = not problems
+        try:
+            table = ResultTable.build(results)
+        except InvalidResultBands as e:
+            problems.append(f"results: {e}")
+        else:
+            if valid and questions:
+                lowest = sum(min(option.score for option in question.options) for question in questions)
+                highest = sum(max(option.score for option in question.options) for question in questions)
+                if table.bands[0].min_score > lowest or table.bands[-1].max_score < highest:
+                    problems.append(
+                        f"results: scores {lowest}..{highest} are possible, "
+                        f"results cover {table.bands[0].min_score}..{table.bands[-1].max_score}"
+                    )
+
+    if problems:
+        raise InvalidTestPackage(problems)
+
+    # Hash of the parsed content, so formatting and comments do not cause a reimport
+    content = json.dumps([
+        title, description, allow_back,
+        [[question.text, [[option.text, option.score] for option in question.options]] for question in questions],
+        [[result.min_score, result.max_score, result.text] for result in results],
+    ], ensure_ascii=False)
+    return TestPackage(
+        name=path.stem,
+        path=path,
+        title=title,
+        description=description,
+        allow_back=allow_back,
+        questions=tuple(questions),
+        results=tuple(results),
+        content_hash=hashlib.sha256(content.encode()).hexdigest(),
+    )
+
+
+def find_packages(paths) -> list[Path]:
+    found = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            found.extend(sorted(child for child in path.iterdir() if child.suffix in PACKAGE_SUFFIXES))
+        else:
+            found.append(path)
+    return found
+
+
+async def _insert_rows(session: AsyncSession, table, rows: list[dict]) -> None:
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        await session.execute(insert(table).values(rows[start:start + INSERT_CHUNK_SIZE]))
+
+
+async def _stored_tests(session: AsyncSession, packages: list[TestPackage]) -> dict[str, tuple[uuid.UUID, str | None]]:
+    """
+    (test id, stored hash) by package name. Tests of the CSV loaders have no package yet and are matched by name.
+    """
+    tests = PsycoTest.__table__
+    result = await session.execute(
+        select(tests.c.package, tests.c.id, tests.c.package_hash)
+        .where(tests.c.package.in_([package.name for package in packages]))
+    )
+    stored = {name: (test_id, content_hash) for name, test_id, content_hash in result.all()}
+
+    unmatched = {package.title: package.name for package in packages if package.name not in stored}
+    if unmatched:
+        result = await session.execute(
+            select(tests.c.name, tests.c.id)
+            .where(tests.c.package.is_(None), tests.c.name.in_(unmatched))
+            .order_by(tests.c.created_at)
+        )
+        for title, test_id in result.all():
+            stored.setdefault(unmatched[title], (test_id, None))
+    return stored
+
+
+async def _answer_ids(session: AsyncSession, texts: set[str]) -> dict[str, uuid.UUID]:
+    answers = PsycoAnswer.__table__
+    texts = sorted(texts)
+    result = await session.execute(
+        select(answers.c.answer_text, answers.c.id)
+        .where(answers.c.answer_text == any_(bindparam("texts", texts, type_=ARRAY(answers.c.answer_text.type))))
+        .distinct(answers.c.answer_text)
+        .order_by(answers.c.answer_text, answers.c.created_at)
+    )
+    ids = dict(result.all())
+
+    missing = [{"id": uuid.uuid4(), "answer_text": text} for text in texts if text not in ids]
+    if missing:
+        await _insert_rows(session, answers, missing)
+        ids.update((row["answer_text"], row["id"]) for row in missing)
+    return ids
+
+
+async def _write_packages(session: AsyncSession, packages: list[TestPackage], stored: dict) -> None:
+    tests = PsycoTest.__table__
+    test_ids = [stored[package.name][0] for package in packages if package.name in stored]
+
+    # Adopt tests of the CSV loaders, then upsert every test by its package name
+    for package in packages:
+        if package.name in stored and stored[package.name][1] is None:
+            await session.execute(
+                update(tests).where(tests.c.id == stored[package.name][0], tests.c.package.is_(None))
+                .values(package=package.name)
+            )
+    stmt = insert(tests).values([
+        {
+            "id": uuid.uuid4(),
+            "name": package.title,
+            "description": package.description,
+            "allow_back": package.allow_back,
+            "package": package.name,
+            "package_hash": package.content_hash,
+        }
+        for package in packages
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tests.c.package],
+        set_={
+            "name": stmt.excluded.name,
+            "description": stmt.excluded.description,
+            "allow_back": stmt.excluded.allow_back,
+            "package_hash": stmt.excluded.package_hash,
+            "updated_at": func.now(),
+        },
+    ).returning(tests.c.package, tests.c.id)
+    ids = dict((await session.execute(stmt)).all())
+
+    # A changed package replaces the whole content of its test
+    if test_ids:
+        questions = PsycoQuestion.__table__
+        selected = bindparam("test_ids", test_ids, type_=ARRAY(tests.c.id.type))
+        await session.execute(
+            delete(PsycoQuestionAnswer.__table__).where(
+                PsycoQuestionAnswer.__table__.c.question_id.in_(
+                    select(questions.c.id).where(questions.c.test_id == any_(selected))
+                )
+            )
+        )
+        await session.execute(delete(questions).where(questions.c.test_id == any_(selected)))
+        await session.execute(delete(PsycoResult.__table__).where(PsycoResult.__table__.c.test_id == any_(selected)))
+
+    answer_ids = await _answer_ids(session, set().union(*(package.answer_texts for package in packages)))
+
+    question_rows, option_rows, result_rows = [], [], []
+    for package in packages:
+        test_id = ids[package.name]
+        for position, question in enumerate(package.questions):
+            question_id = uuid.uuid4()
+            question_rows.append({"id": question_id, "test_id": test_id, "question_text": question.text, "position": position})
+            option_rows.extend(
+                {"id": uuid.uuid4(), "question_id": question_id, "answer_id": answer_ids[option.text], "score_value": option.score,
+                 "position": option_position}
+                for option_position, option in enumerate(question.options)
+            )
+        result_rows.extend(
+            {"id": uuid.uuid4(), "test_id": test_id, "min_score": result.min_score, "max_score": result.max_score, "text": result.text}
+            for result in package.results
+        )
+
+    # Questions and options keep their package order in the position column, the catalog shows them in that order
+    await _insert_rows(session, PsycoQuestion.__table__, question_rows)
+    await _insert_rows(session, PsycoQuestionAnswer.__table__, option_rows)
+    await _insert_rows(session, PsycoResult.__table__, result_rows)
+
+
+async def import_test_packages(paths=(PACKAGES_DIR,), dry_run: bool = False) -> list[ImportReport]:
+    """
+    Imports every package found under paths in one transaction and returns a report per package.
+    Invalid packages are reported and skipped, the valid ones are still imported.
+    """
+    reports, packages = {}, []
+    for path in find_packages(paths):
+        try:
+            package = parse_package(path)
+        except InvalidTestPackage as e:
+            reports[path.stem] = ImportReport(package=path.stem, status="invalid", questions=0, options=0, results=0, problems=e.problems)
+            continue
+        if package.name in reports or any(other.name == package.name for other in packages):
+            reports[path.name] = ImportReport(package=path.name, status="invalid", questions=0, options=0, results=0,
+                                              problems=[f"another file already defines package {package.name}"])
+            continue
+        packages.append(package)
+
+    changed = []
+    async with background_db_helper.session_factory() as session:
+        async with session.begin():
+            # Every worker seeds on start: the second one waits here and then finds the packages already imported
+            await session.execute(select(func.pg_advisory_xact_lock(IMPORT_LOCK_KEY)))
+            stored = await _stored_tests(session, packages) if packages else {}
+            for package in packages:
+                if package.name not in stored:
+                    status = "created"
+                elif stored[package.name][1] != package.content_hash:
+                    status = "updated"
+                else:
+                    reports[package.name] = ImportReport(package=package.name, status="unchanged", questions=0, options=0, results=0, problems=[])
+                    continue
+                changed.append(package)
+                reports[package.name] = ImportReport(
+                    package=package.name,
+                    status=f"would be {status}" if dry_run else status,
+                    questions=len(package.questions),
+                    options=sum(len(question.options) for question in package.questions),
+                    results=len(package.results),
+                    problems=[],
+                )
+
+            if changed and not dry_run:
+                await _write_packages(session, changed, stored)
+
+    if changed and not dry_run:
+        psyco_test_catalog.invalidate()
+    for report in reports.values():
+        logger.info(f"Psyco test package {report}")
+    return list(reports.values())
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import psyco test packages")
+    parser.add_argument("paths", nargs="*", default=[str(PACKAGES_DIR)], help="package files or folders")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without writing")
+    args = parser.parse_args(argv)
+
+    try:
+        reports = await import_test_packages(args.paths, dry_run=args.dry_run)
+    except Exception as e:
+        logger.exception(f"Error in import_test_packages: {e}")
+        return 1
+    finally:
+        await background_db_helper.dispose()
+
+    for report in reports:
+        print(report)
+    return 1 if any(report.status == "invalid" for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
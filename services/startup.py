@@ -0,0 +1,247 @@
+# services/startup.py
+
+"""
+Startup orchestration.
+
+Before the bot accepts updates the worker runs these phases, each as soon as the phases it depends on are done:
+
+    migrations      the database schema is at the alembic head
+    seeding         changed test packages from psyco_tests_data are imported     (after migrations)
+    pool_warmup     every pool opens pool_size connections
+    catalogs        active psyco tests and movie quizzes are compiled into the catalogs   (after seeding)
+
+The worker is ready when every enabled phase is done. A failed required phase keeps the bot from starting,
+after a failed optional phase the bot is started anyway (the pools and catalogs fill up on first use then),
+but the worker reports itself degraded instead of ready. Phase states and timings are served by the
+readiness endpoint.
+"""
+
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from sqlalchemy import select, text
+
+from core import logger, settings
+from core.models import db_helper, engine_registry
+from utils import FrozenSlots
+from .movie_quiz_catalog import movie_quiz_catalog
+from .psyco_test_catalog import psyco_test_catalog
+
+
+ALEMBIC_DIR = Path(__file__).parent.parent / "alembic"
+
+
+class StartupPhase(FrozenSlots):
+    __slots__ = ("name", "run", "depends_on", "required", "enabled")
+
+
+class PhaseState:
+    __slots__ = ("status", "started_at", "finished_at", "error")
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | done | failed | skipped
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+
+class StartupOrchestrator:
+    def __init__(self, phases: list[StartupPhase]):
+        self.phases = {phase.name: phase for phase in phases}
+        self.states = {phase.name: PhaseState() for phase in phases}
+        self.started_at = None
+        self.finished_at = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @property
+    def serving(self) -> bool:
+        """
+        Every required phase is done, the bot can receive updates.
+        """
+        return self.finished_at is not None and not any(
+            self.phases[name].required and state.status != "done"
+            for name, state in self.states.items()
+        )
+
+    @property
+    def ready(self) -> bool:
+        """
+        Every enabled phase is done.
+        """
+        return self.finished_at is not None and all(
+            # Disabled phases are skipped without an error
+            state.status == "done" or (state.status == "skipped" and state.error is None)
+            for state in self.states.values()
+        )
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is None:
+            return "starting"
+        if self.ready:
+            return "ready"
+        return "degraded" if self.serving else "failed"
+
+    async def run(self) -> bool:
+        """
+        Runs all phases and returns whether the bot can receive updates.
+        """
+        self.started_at = time.monotonic()
+        self._tasks = {name: asyncio.create_task(self._run_phase(self.phases[name])) for name in self.phases}
+        try:
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            self.finished_at = time.monotonic()
+
+        logger.info(
+            f"Startup finished in {self._ms(self.started_at, self.finished_at)} ms, status={self.status}: "
+            + ", ".join(
+                f"{name}={state.status}"
+                + (f" {self._ms(state.started_at, state.finished_at)} ms" if state.finished_at else "")
+                for name, state in self.states.items()
+            )
+        )
+        return self.serving
+
+    async def _run_phase(self, phase: StartupPhase) -> None:
+        state = self.states[phase.name]
+        for dependency in phase.depends_on:
+            await asyncio.shield(self._tasks[dependency])
+            # A failed optional phase does not stop the phases after it, a failed required one does
+            dependency_state = self.states[dependency]
+            if dependency_state.error and (self.phases[dependency].required or dependency_state.status == "skipped"):
+                state.status = "skipped"
+                state.error = f"{dependency} did not finish"
+                return
+
+        if not phase.enabled():
+            state.status = "skipped"
+            return
+
+        state.status = "running"
+        state.started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(phase.run(), timeout=settings.startup.phase_timeout)
+            state.status = "done"
+        except Exception as e:
+            state.status = "failed"
+            state.error = str(e) or e.__class__.__name__
+            log = logger.error if phase.required else logger.warning
+            log(f"Startup phase {phase.name} failed: {state.error}")
+        finally:
+            state.finished_at = time.monotonic()
+
+    def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+    def report(self) -> dict:
+        now = time.monotonic()
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "total_ms": self._ms(self.started_at, self.finished_at or now) if self.started_at else None,
+            "phases": {
+                name: {
+                    "status": state.status,
+                    "required": self.phases[name].required,
+                    "duration_ms": self._ms(state.started_at, state.finished_at or now) if state.started_at else None,
+                    "error": state.error,
+                }
+                for name, state in self.states.items()
+            },
+        }
+
+    @staticmethod
+    def _ms(start: float, end: float) -> int:
+        return round((end - start) * 1000)
+
+
+def _alembic_heads() -> set[str]:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+async def check_migrations() -> None:
+    # Reading the revision files is blocking file IO
+    heads = await asyncio.to_thread(_alembic_heads)
+    async with db_helper.session_factory() as session:
+        current = set((await session.execute(text("SELECT version_num FROM alembic_version"))).scalars().all())
+    if current != heads:
+        raise RuntimeError(
+            f"database is at revision {', '.join(sorted(current)) or 'none'}, "
+            f"the code expects {', '.join(sorted(heads))}; run alembic upgrade head"
+        )
+
+
+async def seed_test_packages() -> None:
+    # Imported here because the importer needs the fully initialized core.models
+    from .psyco_test_importer import import_test_packages
+    reports = await import_test_packages()
+    invalid = [report.package for report in reports if report.status == "invalid"]
+    if invalid:
+        logger.warning(f"Invalid test packages were not imported: {', '.join(invalid)}")
+
+
+async def warm_up_pools() -> None:
+    async def warm_up(helper) -> None:
+        # Connections are held together, so the pool has to open pool_size of them
+        async with AsyncExitStack() as stack:
+            connections = await asyncio.gather(*(
+                stack.enter_async_context(helper.engine.connect())
+                for _ in range(helper.pool_config.pool_size)
+            ))
+            for connection in connections:
+                await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(warm_up(helper) for helper in engine_registry))
+
+
+async def _preload_psyco_tests() -> int:
+    from core.models import PsycoTest
+    async with db_helper.session_factory() as session:
+        test_ids = (await session.execute(select(PsycoTest.id).where(PsycoTest.is_active == True))).scalars().all()
+
+    # The catalog returns None for a test it could not load or compile, the reason is logged there
+    failed = [test_id for test_id in test_ids if await psyco_test_catalog.get(test_id) is None]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(test_ids)} psyco tests could not be loaded")
+    return len(test_ids)
+
+
+async def _preload_movie_quizzes() -> int:
+    from core.models import MovieQuiz
+    async with db_helper.session_factory() as session:
+        quiz_ids = (await session.execute(select(MovieQuiz.id).where(MovieQuiz.is_active == True))).scalars().all()
+
+    if await movie_quiz_catalog.listing() is None:
+        raise RuntimeError("the movie quiz listing could not be loaded")
+    failed = [quiz_id for quiz_id in quiz_ids if await movie_quiz_catalog.get(quiz_id) is None]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(quiz_ids)} movie quizzes could not be loaded")
+    return len(quiz_ids)
+
+
+async def preload_catalogs() -> None:
+    # The two catalogs do not depend on each other
+    tests, quizzes = await asyncio.gather(_preload_psyco_tests(), _preload_movie_quizzes(), return_exceptions=True)
+    errors = [str(result) for result in (tests, quizzes) if isinstance(result, BaseException)]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    logger.info(f"Preloaded {tests} psyco tests and {quizzes} movie quizzes")
+
+
+startup = StartupOrchestrator([
+    StartupPhase(name="migrations", run=check_migrations, depends_on=(), required=True, enabled=lambda: True),
+    StartupPhase(name="seeding", run=seed_test_packages, depends_on=("migrations",), required=False,
+                 enabled=lambda: settings.startup.seed_test_packages),
+    StartupPhase(name="pool_warmup", run=warm_up_pools, depends_on=(), required=False,
+                 enabled=lambda: settings.startup.warm_up_pools),
+    StartupPhase(name="catalogs", run=preload_catalogs, depends_on=("seeding",), required=False, enabled=lambda: True),
+])
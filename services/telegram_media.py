@@ -0,0 +1,149 @@
+# services/telegram_media.py
+
+"""
+Registry of Telegram file_ids for the stored test and quiz pictures.
+
+The first time a picture is sent it is uploaded from the media folder (or, if the file is not on this
+host, fetched by Telegram from the public media URL). The file_id from Telegram's answer is stored in
+telegram_files, and every later send or edit_media of that picture only passes the file_id.
+"""
+
+import asyncio
+import os
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from core import logger, settings
+from core.models import db_helper
+from core.models.telegram_file import TelegramFile
+from .image_pipeline import telegram_variant
+
+
+def _file_version(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class TelegramMediaRegistry:
+    def __init__(self):
+        # (bot id, path) -> (file_id, size, mtime_ns)
+        self._files: dict[tuple[int, str], tuple[str, int, int]] = {}
+        self._loaded_bots: set[int] = set()
+        self._lock = asyncio.Lock()
+
+    async def _load(self, bot_id: int) -> None:
+        if bot_id in self._loaded_bots:
+            return
+        async with self._lock:
+            if bot_id in self._loaded_bots:
+                return
+            async with db_helper.session_factory() as session:
+                try:
+                    result = await session.execute(
+                        select(TelegramFile.path, TelegramFile.file_id, TelegramFile.file_size, TelegramFile.file_mtime_ns)
+                        .where(TelegramFile.bot_id == bot_id)
+                    )
+                except Exception as e:
+                    logger.exception(f"Error in TelegramMediaRegistry._load: {e}")
+                    return
+                for path, file_id, size, mtime_ns in result.all():
+                    self._files[(bot_id, path)] = (file_id, size, mtime_ns)
+            self._loaded_bots.add(bot_id)
+
+    async def get_file_id(self, bot: Bot, picture: str) -> str | None:
+        await self._load(bot.id)
+        entry = self._files.get((bot.id, picture))
+        if entry is None:
+            return None
+        file_id, size, mtime_ns = entry
+        version = _file_version(picture)
+        # The file was replaced on disk under the same name
+        if version is not None and version != (size, mtime_ns):
+            return None
+        return file_id
+
+    async def input_photo(self, bot: Bot, picture: str) -> str | FSInputFile:
+        file_id = await self.get_file_id(bot, picture)
+        if file_id:
+            return file_id
+        # Uploads use the re-encoded variant, the original can be many megabytes
+        upload = telegram_variant(picture)
+        if os.path.isfile(upload):
+            return FSInputFile(upload)
+        return f"{settings.media.base_url}/{upload}"
+
+    async def remember(self, bot: Bot, picture: str, message: types.Message | bool | None) -> None:
+        if not isinstance(message, types.Message) or not message.photo:
+            return
+        photo = message.photo[-1]
+        key = (bot.id, picture)
+        size, mtime_ns = _file_version(picture) or (0, 0)
+        if self._files.get(key) == (photo.file_id, size, mtime_ns):
+            return
+
+        self._files[key] = (photo.file_id, size, mtime_ns)
+        async with db_helper.session_factory() as session:
+            try:
+                stmt = insert(TelegramFile.__table__).values(
+                    bot_id=bot.id, path=picture, file_id=photo.file_id, file_unique_id=photo.file_unique_id,
+                    file_size=size, file_mtime_ns=mtime_ns, is_active=True,
+                )
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=["bot_id", "path"],
+                    set_={
+                        "file_id": stmt.excluded.file_id,
+                        "file_unique_id": stmt.excluded.file_unique_id,
+                        "file_size": stmt.excluded.file_size,
+                        "file_mtime_ns": stmt.excluded.file_mtime_ns,
+                    },
+                ))
+                await session.commit()
+            except Exception as e:
+                logger.exception(f"Error in TelegramMediaRegistry.remember: {e}")
+                await session.rollback()
+
+    def forget(self, bot: Bot, picture: str) -> None:
+        self._files.pop((bot.id, picture), None)
+
+
+telegram_media = TelegramMediaRegistry()
+
+
+async def _with_cached_photo(bot: Bot, picture: str, send):
+    """
+    Calls send(media) with the cached file_id of the picture, or with an upload when there is none.
+    A file_id Telegram no longer accepts is dropped and the picture is uploaded again.
+    """
+    media = await telegram_media.input_photo(bot, picture)
+    try:
+        result = await send(media)
+    except TelegramBadRequest as e:
+        if not isinstance(media, str) or "file identifier" not in str(e):
+            raise
+        logger.warning(f"Cached file_id of {picture} was rejected, uploading again: {e}")
+        telegram_media.forget(bot, picture)
+        result = await send(await telegram_media.input_photo(bot, picture))
+
+    await telegram_media.remember(bot, picture, result)
+    return result
+
+
+async def answer_photo(message: types.Message, picture: str, caption: str, reply_markup=None):
+    return await _with_cached_photo(
+        message.bot, picture,
+        lambda media: message.answer_photo(photo=media, caption=caption, reply_markup=reply_markup),
+    )
+
+
+async def edit_photo(message: types.Message, picture: str, caption: str, reply_markup=None):
+    return await _with_cached_photo(
+        message.bot, picture,
+        lambda media: message.edit_media(media=types.InputMediaPhoto(media=media, caption=caption), reply_markup=reply_markup),
+    )
@@ -1,70 +1,243 @@
 # services/user_service.py
 
-from sqlalchemy import select
+import asyncio
 
-from core import logger
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from core import logger, settings
 from core.models import TGUser, db_helper
+from utils import FrozenSlots, TTLCache, MISSING
 
 
-class UserService:
+def _upsert_statement(rows: list[dict]):
+    """
+    INSERT ... ON CONFLICT (chat_id) DO UPDATE for one or many users. Existing users keep their
+    is_superuser flag, updated_at only moves when the username actually changed.
+    """
+    stmt = insert(TGUser.__table__).values(rows)
+    table = TGUser.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.chat_id],
+        set_={
+            "username": stmt.excluded.username,
+            "updated_at": case(
+                (table.c.username.is_distinct_from(stmt.excluded.username), func.now()),
+                else_=table.c.updated_at,
+            ),
+        },
+    )
 
-    @staticmethod
-    async def create_user(chat_id: int, username: str | None) -> TGUser:
-        async for session in db_helper.session_getter():
-            try:
-                # Check if user exists
-                result = await session.execute(select(TGUser).where(TGUser.chat_id == chat_id))
-                existing_user = result.scalar_one_or_none()
 
-                if existing_user:
-                    logger.info("User %s already exists", chat_id)
-                    return existing_user
+class UserProfile(FrozenSlots):
+    __slots__ = ("id", "chat_id", "username", "is_superuser", "is_active")
 
-                user = TGUser(chat_id=chat_id, username=username, is_superuser=False)
-                session.add(user)
-                await session.commit()
-                await session.refresh(user)
-                return user
+    def __repr__(self):
+        return f"<UserProfile(chat_id={self.chat_id}, username={self.username}, is_superuser={self.is_superuser})>"
+
+
+class UserProfileCache:
+    """
+    LRU+TTL cache of user profiles by chat_id, so hot users are resolved without a database round trip.
+    A lookup that started before an invalidation of its user (or of the whole cache) does not store
+    its (possibly stale) result.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+        # Generation of the last invalidation per chat_id, kept as long as a stale lookup could still store
+        self._invalidated = TTLCache(maxsize, ttl)
+        self._cleared_at = 0
+        self.generation = 0
+
+    def get(self, chat_id: int):
+        return self._cache.get(chat_id)
+
+    def set(self, chat_id: int, profile: UserProfile | None, generation: int | None = None) -> None:
+        if generation is not None:
+            if generation < self._cleared_at:
+                return
+            invalidated_at = self._invalidated.get(chat_id)
+            if invalidated_at is not MISSING and invalidated_at > generation:
+                return
+        self._cache.set(chat_id, profile)
+
+    def invalidate(self, chat_id: int | None = None) -> None:
+        self.generation += 1
+        if chat_id is None:
+            self._cleared_at = self.generation
+            self._cache.clear()
+            self._invalidated.clear()
+        else:
+            self._cache.pop(chat_id)
+            self._invalidated.set(chat_id, self.generation)
+
+
+user_profile_cache = UserProfileCache(settings.users.cache_size, settings.users.cache_ttl)
 
+
+class UserUpsertBuffer:
+    """
+    Write-behind buffer for /start: users seen within `delay` seconds are written with one statement.
+    A user seen several times in a batch is written once with the latest username.
+    A batch that could not be written is retried with the next flush, up to max_pending users.
+    """
+
+    def __init__(self, delay: float, max_batch: int, max_pending: int):
+        self.delay = delay
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: dict[int, str | None] = {}
+        self._flush_task: asyncio.Task | None = None
+        # Flushes started for a full batch, keep references so the tasks are not garbage collected
+        self._batch_tasks: set[asyncio.Task] = set()
+
+    def add(self, chat_id: int, username: str | None) -> None:
+        self._pending[chat_id] = username
+        # The user may be cached as unknown, the next lookup has to wait for the database
+        user_profile_cache.invalidate(chat_id)
+        if len(self._pending) >= self.max_batch:
+            task = asyncio.create_task(self.flush())
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"chat_id": chat_id, "username": username, "is_superuser": False}
+            for chat_id, username in pending.items()
+        ]
+        async with db_helper.session_factory() as session:
+            try:
+                await session.execute(_upsert_statement(rows))
+                await session.commit()
             except Exception as e:
-                logger.exception(f"Error in create_user: {e}")
+                logger.exception(f"Error in UserUpsertBuffer.flush ({len(rows)} users): {e}")
                 await session.rollback()
-            finally:
-                await session.close()
+                self._retry_later(pending)
+                return
+
+        for chat_id in pending:
+            user_profile_cache.invalidate(chat_id)
+
+    def _retry_later(self, pending: dict[int, str | None]) -> None:
+        # Users seen again in the meantime keep their newer username
+        self._pending = {**pending, **self._pending}
+        dropped = len(self._pending) - self.max_pending
+        if dropped > 0:
+            for chat_id in list(self._pending)[:dropped]:
+                del self._pending[chat_id]
+                logger.error(f"Dropped /start of chat {chat_id} that could not be saved")
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._flush_task is not None:
+            # The last flush failed, there is no later one
+            self._flush_task.cancel()
+            self._flush_task = None
+            logger.error(f"Dropped /start of {len(self._pending)} users that could not be saved")
+
+
+class UserService:
+    _upsert_buffer: UserUpsertBuffer | None = None
+
+    @classmethod
+    def upsert_buffer(cls) -> UserUpsertBuffer | None:
+        if cls._upsert_buffer is None and settings.users.upsert_batch_delay_ms > 0:
+            cls._upsert_buffer = UserUpsertBuffer(
+                settings.users.upsert_batch_delay_ms / 1000,
+                settings.users.upsert_batch_size,
+                settings.users.upsert_max_pending,
+            )
+        return cls._upsert_buffer
 
     @staticmethod
-    async def get_user(chat_id: int) -> TGUser | None:
-        async for session in db_helper.session_getter():
+    async def upsert_user(chat_id: int, username: str | None) -> TGUser | None:
+        """
+        Creates the user or updates the username in a single round trip.
+        """
+        async with db_helper.session_factory() as session:
             try:
-                result = await session.execute(select(TGUser).where(TGUser.chat_id == chat_id))
-                return result.scalar_one_or_none()
+                stmt = _upsert_statement([{"chat_id": chat_id, "username": username, "is_superuser": False}])
+                result = await session.execute(
+                    select(TGUser).from_statement(stmt.returning(*TGUser.__table__.c))
+                )
+                user = result.scalar_one()
+                await session.commit()
             except Exception as e:
-                logger.exception(f"Error in get_user: {e}")
-            finally:
-                await session.close()
+                logger.exception(f"Error in upsert_user: {e}")
+                await session.rollback()
+                return None
+
+        user_profile_cache.set(chat_id, UserProfile(
+            id=user.id, chat_id=user.chat_id, username=user.username,
+            is_superuser=user.is_superuser, is_active=user.is_active,
+        ))
+        return user
+
+    @classmethod
+    async def register_user(cls, chat_id: int, username: str | None) -> None:
+        """
+        Records a /start: through the write-behind buffer when it is enabled, otherwise right away.
+        """
+        buffer = cls.upsert_buffer()
+        if buffer is not None:
+            buffer.add(chat_id, username)
+        else:
+            await cls.upsert_user(chat_id, username)
 
     @staticmethod
-    async def get_all_users() -> list[TGUser]:
-        async for session in db_helper.session_getter():
+    def invalidate_cache(chat_id: int | None = None) -> None:
+        user_profile_cache.invalidate(chat_id)
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._upsert_buffer is not None:
+            await cls._upsert_buffer.close()
+
+    @classmethod
+    async def get_user(cls, chat_id: int) -> UserProfile | None:
+        """
+        Returns the cached profile of the user. Unknown users are cached too, as None.
+        """
+        profile = user_profile_cache.get(chat_id)
+        if profile is not MISSING:
+            return profile
+
+        generation = user_profile_cache.generation
+        async with db_helper.session_factory() as session:
             try:
-                result = await session.execute(select(TGUser))
-                return result.scalars().unique().all()
+                result = await session.execute(
+                    select(TGUser.id, TGUser.chat_id, TGUser.username, TGUser.is_superuser, TGUser.is_active)
+                    .where(TGUser.chat_id == chat_id)
+                )
+                row = result.one_or_none()
             except Exception as e:
-                logger.exception(f"Error in get_all_users: {e}")
-            finally:
-                await session.close()
+                logger.exception(f"Error in get_user: {e}")
+                return None
+
+        profile = UserProfile(**row._asdict()) if row else None
+        user_profile_cache.set(chat_id, profile, generation)
+        return profile
 
     @classmethod
     async def is_superuser(cls, chat_id: int) -> bool:
-        async for session in db_helper.session_getter():
-            try:
-                result = await session.execute(select(TGUser).where(TGUser.chat_id == chat_id))
-                user = result.scalar_one_or_none()
-                return user is not None and user.is_superuser
-            except Exception as e:
-                logger.exception(f"Error in is_superuser: {e}")
-            finally:
-                await session.close()
+        user = await cls.get_user(chat_id)
+        return user is not None and user.is_superuser
 
     @staticmethod
     async def update_username(chat_id: int, new_username: str | None) -> bool:
@@ -75,6 +248,7 @@ class UserService:
                 if user:
                     user.username = new_username
                     await session.commit()
+                    user_profile_cache.invalidate(chat_id)
                     logger.info(f"Updated username for user {chat_id} to {new_username}")
                     return True
                 else:
@@ -7,16 +7,8 @@ while ! nc -z pg "$POSTGRES_PORT"; do sleep 1; done
 # Run migrations
 alembic upgrade head
 
-# Check if initial data collection has been done
-INIT_FLAG="/app/.init_data_collected"
-if [ ! -f "$INIT_FLAG" ]; then
-    echo "Running initial data collection..."
-    python3 collect_data_on_start.py
-    # Create the flag file to indicate initial collection is done
-    touch "$INIT_FLAG"
-else
-    echo "Initial data already collected. Skipping..."
-fi
+# Test packages are imported, pools warmed up and catalogs preloaded by the app itself, see services/startup.py
+# and GET /ready
 
 # Run the app
 exec python3 main.py
\ No newline at end of file
@@ -0,0 +1,10 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# Tests import the app packages the way main.py does: core.models before services,
+# because the models import the file storages from services
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import core.models  # noqa: E402,F401
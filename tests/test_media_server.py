@@ -0,0 +1,92 @@
+# tests/test_media_server.py
+
+import os
+from email.utils import formatdate
+
+import pytest
+from starlette.datastructures import Headers
+
+from services.media_server import MediaStaticFiles, _etag, _etag_matches, _parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 900)),
+    ("bytes=-100", (900, 100)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes=900-5000", (900, 100)),
+    ("bytes=999-999", (999, 1)),
+    # Not honoured as one range: the whole file is sent
+    ("bytes=0-10,20-30", None),
+    ("items=0-10", None),
+    ("bytes=10-5", None),
+    ("bytes=a-b", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        _parse_range(header, size)
+
+
+@pytest.mark.parametrize("header, weak, expected", [
+    ('"abc"', False, True),
+    ('"x", "abc"', False, True),
+    ("*", False, True),
+    ('W/"abc"', True, True),
+    ('W/"abc"', False, False),
+    ('"abcd"', True, False),
+])
+def test_etag_matches(header, weak, expected):
+    assert _etag_matches('"abc"', header, weak) is expected
+
+
+def test_etag_of_content_addressed_name_is_the_hash(tmp_path):
+    path = tmp_path / "picture.jpg"
+    path.write_bytes(b"data")
+    stat_result = os.stat(path)
+    digest = "0" * 64
+    assert _etag(f"{digest}_tg.jpg", stat_result) == f'"{digest}_tg"'
+    assert _etag("picture.jpg", stat_result) == f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+@pytest.fixture
+def media(tmp_path):
+    return MediaStaticFiles(directory=tmp_path)
+
+
+def test_if_none_match_wins_over_if_modified_since(media):
+    response = Headers({"etag": '"abc"', "last-modified": "Sun, 18 Oct 2026 10:00:00 GMT"})
+    assert media.is_not_modified(response, Headers({"if-none-match": 'W/"abc"'}))
+    assert not media.is_not_modified(response, Headers({
+        "if-none-match": '"other"', "if-modified-since": "Mon, 19 Oct 2026 10:00:00 GMT",
+    }))
+
+
+def test_if_modified_since(media):
+    response = Headers({"etag": '"abc"', "last-modified": "Sun, 18 Oct 2026 10:00:00 GMT"})
+    assert media.is_not_modified(response, Headers({"if-modified-since": "Sun, 18 Oct 2026 10:00:00 GMT"}))
+    assert not media.is_not_modified(response, Headers({"if-modified-since": "Sat, 17 Oct 2026 10:00:00 GMT"}))
+    assert not media.is_not_modified(response, Headers({"if-modified-since": "not a date"}))
+    assert not media.is_not_modified(response, Headers({}))
+
+
+def test_if_range(tmp_path):
+    path = tmp_path / "picture.jpg"
+    path.write_bytes(b"data")
+    stat_result = os.stat(path)
+    assert MediaStaticFiles._if_range_matches(None, '"abc"', stat_result)
+    assert MediaStaticFiles._if_range_matches('"abc"', '"abc"', stat_result)
+    # If-Range needs a strong match
+    assert not MediaStaticFiles._if_range_matches('W/"abc"', '"abc"', stat_result)
+    assert MediaStaticFiles._if_range_matches(formatdate(stat_result.st_mtime, usegmt=True), '"abc"', stat_result)
+    assert not MediaStaticFiles._if_range_matches("Sat, 17 Oct 2026 10:00:00 GMT", '"abc"', stat_result)
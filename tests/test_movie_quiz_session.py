@@ -0,0 +1,44 @@
+# tests/test_movie_quiz_session.py
+
+from services.fsm_sessions import MovieQuizSession
+from utils import FrozenSlots
+
+
+class QuizStub(FrozenSlots):
+    __slots__ = ("id", "version", "question_ids")
+
+
+def make_quiz(size: int) -> QuizStub:
+    return QuizStub(id="quiz", version=1, question_ids=tuple(f"q{number}" for number in range(size)))
+
+
+def test_sample_is_drawn_once_and_survives_fsm_data():
+    quiz = make_quiz(1000)
+    session = MovieQuizSession.start(quiz, 10)
+    assert session.count == 10
+    assert len(set(session.sample)) == 10
+
+    restored = MovieQuizSession.from_data({MovieQuizSession.key: session.dump()})
+    asked = []
+    while not restored.finished:
+        asked.append(restored.question_id(quiz))
+        restored.position += 1
+    assert asked == [quiz.question_ids[index] for index in session.sample]
+
+
+def test_zero_or_too_large_count_asks_every_question():
+    quiz = make_quiz(5)
+    assert sorted(MovieQuizSession.start(quiz, 0).sample) == [0, 1, 2, 3, 4]
+    assert MovieQuizSession.start(quiz, 50).count == 5
+
+
+def test_finished():
+    session = MovieQuizSession("quiz", 1, 0, [2, 0], position=1)
+    assert not session.finished
+    session.position = 2
+    assert session.finished
+
+
+def test_records_of_former_layouts_are_dropped():
+    assert MovieQuizSession.from_data({MovieQuizSession.key: ["quiz", 1, 7, 10, 0, 0]}) is None
+    assert MovieQuizSession.from_data({}) is None
@@ -0,0 +1,108 @@
+# tests/test_psyco_scoring.py
+
+import pytest
+
+from services.fsm_sessions import PsycoTestSession
+from services.psyco_scoring import (
+    InvalidResultBands, ResultTable, apply_answer, build_option_map, chosen_options, revert_answer,
+)
+from utils import FrozenSlots
+
+
+class Band(FrozenSlots):
+    __slots__ = ("min_score", "max_score", "text")
+
+
+class Option(FrozenSlots):
+    __slots__ = ("id", "score")
+
+
+class Question(FrozenSlots):
+    __slots__ = ("options",)
+
+
+class CompiledTestStub(FrozenSlots):
+    __slots__ = ("questions", "option_map")
+
+
+def bands(*ranges):
+    return [Band(min_score=low, max_score=high, text=f"{low}..{high}") for low, high in ranges]
+
+
+def make_test():
+    questions = (
+        Question(options=(Option(id="a0", score=0), Option(id="a1", score=2))),
+        Question(options=(Option(id="b0", score=1), Option(id="b1", score=3))),
+    )
+    return CompiledTestStub(questions=questions, option_map=build_option_map(questions))
+
+
+def test_result_table_sorts_bands():
+    table = ResultTable.build(bands((10, 19), (0, 9), (20, 30)))
+    assert [band.min_score for band in table] == [0, 10, 20]
+    assert table.starts == (0, 10, 20)
+    assert len(table) == 3
+
+
+@pytest.mark.parametrize("ranges, message", [
+    (((5, 1),), "inverted"),
+    (((0, 10), (10, 20)), "overlap"),
+    (((0, 9), (11, 20)), "not covered"),
+])
+def test_result_table_rejects_invalid_bands(ranges, message):
+    with pytest.raises(InvalidResultBands, match=message):
+        ResultTable.build(bands(*ranges))
+
+
+@pytest.mark.parametrize("score, expected", [
+    (0, (0, 9)),
+    (9, (0, 9)),
+    (10, (10, 19)),
+    (19, (10, 19)),
+    (30, (20, 30)),
+    (-1, None),
+    (31, None),
+])
+def test_result_table_find(score, expected):
+    table = ResultTable.build(bands((0, 9), (10, 19), (20, 30)))
+    band = table.find(score)
+    assert ((band.min_score, band.max_score) if band else None) == expected
+
+
+def test_result_table_single_point_band():
+    table = ResultTable.build(bands((0, 0), (1, 5)))
+    assert table.find(0).max_score == 0
+    assert table.find(1).min_score == 1
+
+
+def test_option_map_indexes_every_option():
+    option_map = make_test().option_map
+    assert set(option_map) == {"a0", "a1", "b0", "b1"}
+    ref = option_map["b1"]
+    assert (ref.question_index, ref.option_index, ref.score) == (1, 1, 3)
+
+
+def test_apply_and_revert_answers():
+    test = make_test()
+    session = PsycoTestSession("test", 1)
+
+    assert apply_answer(session, test, "a1")
+    # A button of a question that is not the current one is ignored
+    assert not apply_answer(session, test, "a0")
+    assert not apply_answer(session, test, "unknown")
+    assert apply_answer(session, test, "b0")
+    assert session.score == 3
+    assert list(session.answers) == [1, 0]
+    assert [option.id for option in chosen_options(session, test)] == ["a1", "b0"]
+
+    assert revert_answer(session, test)
+    assert session.score == 2
+    assert session.index == 1
+    assert revert_answer(session, test)
+    assert not revert_answer(session, test)
+    assert session.score == 0
+
+
+def test_session_keeps_option_indices_above_255():
+    session = PsycoTestSession("test", 1, answers=[300])
+    assert session.dump()[3] == [300]
@@ -0,0 +1,105 @@
+# tests/test_psyco_test_importer.py
+
+import pytest
+
+from services.psyco_test_importer import PACKAGES_DIR, InvalidTestPackage, find_packages, parse_package
+
+
+VALID_PACKAGE = """
+name: Test
+description: About the test
+options:
+  - {text: Rarely, score: 0}
+  - {text: Often, score: 1}
+questions:
+  - First
+  - text: Second
+    options: [{text: Never, score: 0}, {text: Always, score: 2}]
+results:
+  - {min_score: 0, max_score: 1, text: Low}
+  - {min_score: 2, max_score: 3, text: High}
+"""
+
+
+def write(tmp_path, text, name="test.yaml"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def problems_of(path) -> list[str]:
+    with pytest.raises(InvalidTestPackage) as error:
+        parse_package(path)
+    return error.value.problems
+
+
+def test_parse_valid_package(tmp_path):
+    package = parse_package(write(tmp_path, VALID_PACKAGE))
+    assert package.name == "test"
+    assert package.title == "Test"
+    assert package.allow_back is True
+    assert [question.text for question in package.questions] == ["First", "Second"]
+    # A plain string question uses the package options
+    assert [option.text for option in package.questions[0].options] == ["Rarely", "Often"]
+    assert [option.score for option in package.questions[1].options] == [0, 2]
+    assert package.answer_texts == {"Rarely", "Often", "Never", "Always"}
+    assert len(package.content_hash) == 64
+
+
+def test_content_hash_ignores_formatting(tmp_path):
+    reformatted = "# comment\n" + VALID_PACKAGE.replace("{text: Rarely, score: 0}", "{score: 0, text: Rarely}")
+    assert parse_package(write(tmp_path, VALID_PACKAGE, "a.yaml")).content_hash == \
+        parse_package(write(tmp_path, reformatted, "b.yaml")).content_hash
+    changed = VALID_PACKAGE.replace("text: Low", "text: Lower")
+    assert parse_package(write(tmp_path, VALID_PACKAGE, "a.yaml")).content_hash != \
+        parse_package(write(tmp_path, changed, "c.yaml")).content_hash
+
+
+def test_every_problem_is_reported(tmp_path):
+    problems = problems_of(write(tmp_path, """
+name: ""
+allow_back: maybe
+questions:
+  - text: Only one option
+    options: [{text: Often, score: 1}]
+  - No options at all
+results:
+  - {min_score: 0, max_score: high, text: Result}
+"""))
+    assert "name: text is missing" in problems
+    assert "allow_back must be true or false" in problems
+    assert "question 1: at least two options are required" in problems
+    assert "question 2: has no options and the package has no default options" in problems
+    assert "result 1: score must be an integer, got 'high'" in problems
+
+
+def test_repeated_option_texts(tmp_path):
+    problems = problems_of(write(tmp_path, VALID_PACKAGE.replace("{text: Often, score: 1}", "{text: Rarely, score: 1}")))
+    assert problems == ["options: option texts repeat"]
+
+
+def test_results_must_cover_every_possible_score(tmp_path):
+    problems = problems_of(write(tmp_path, VALID_PACKAGE.replace("max_score: 3", "max_score: 2")))
+    assert problems == ["results: scores 0..3 are possible, results cover 0..2"]
+
+
+def test_invalid_result_bands(tmp_path):
+    problems = problems_of(write(tmp_path, VALID_PACKAGE.replace("min_score: 2", "min_score: 1")))
+    assert len(problems) == 1 and "overlap" in problems[0]
+
+
+@pytest.mark.parametrize("text", ["- just a list", "name: [unclosed"])
+def test_unreadable_packages(tmp_path, text):
+    assert len(problems_of(write(tmp_path, text))) == 1
+
+
+def test_find_packages(tmp_path):
+    write(tmp_path, VALID_PACKAGE, "b.yaml")
+    write(tmp_path, VALID_PACKAGE, "a.json")
+    write(tmp_path, "notes", "readme.txt")
+    assert [path.name for path in find_packages([tmp_path])] == ["a.json", "b.yaml"]
+
+
+def test_shipped_packages_are_valid():
+    for path in find_packages([PACKAGES_DIR]):
+        parse_package(path)
@@ -0,0 +1,58 @@
+# tests/test_token_bucket.py
+
+import asyncio
+import time
+
+from services.broadcast import TokenBucket
+
+
+def test_burst_up_to_capacity_is_not_delayed():
+    async def run():
+        bucket = TokenBucket(rate=1.0, capacity=3)
+        started_at = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started_at
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_calls_beyond_capacity_wait_for_the_rate():
+    async def run():
+        bucket = TokenBucket(rate=20.0, capacity=1)
+        await bucket.acquire()
+        started_at = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        return time.monotonic() - started_at
+
+    # Two more tokens at 20 per second
+    assert 0.08 <= asyncio.run(run()) < 0.5
+
+
+def test_pause_blocks_and_empties_the_bucket():
+    async def run():
+        bucket = TokenBucket(rate=100.0, capacity=5)
+        bucket.pause(0.1)
+        started_at = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started_at, bucket.tokens
+
+    waited, tokens = asyncio.run(run())
+    assert waited >= 0.09
+    assert tokens < 5
+
+
+def test_waiters_are_served_in_order():
+    async def run():
+        bucket = TokenBucket(rate=50.0, capacity=1)
+        served = []
+
+        async def take(number):
+            await bucket.acquire()
+            served.append(number)
+
+        await asyncio.gather(*(take(number) for number in range(5)))
+        return served
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
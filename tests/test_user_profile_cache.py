@@ -0,0 +1,32 @@
+# tests/test_user_profile_cache.py
+
+from services.user_service import UserProfileCache
+from utils import MISSING
+
+
+def test_lookup_started_before_key_invalidation_is_not_stored():
+    cache = UserProfileCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    # /start of the user lands while the lookup reads the database
+    cache.invalidate(1)
+    cache.set(1, None, generation)
+    assert cache.get(1) is MISSING
+
+    cache.set(1, None, cache.generation)
+    assert cache.get(1) is None
+
+
+def test_key_invalidation_does_not_affect_other_users():
+    cache = UserProfileCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.set(2, None, generation)
+    assert cache.get(2) is None
+
+
+def test_lookup_started_before_clear_is_not_stored():
+    cache = UserProfileCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate()
+    cache.set(2, None, generation)
+    assert cache.get(2) is MISSING
@@ -1,5 +1,12 @@
 __all__ = [
     "camel_case_to_snake_case",
+    "FrozenSlots",
+    "TTLCache",
+    "MISSING",
+    "MetricsRegistry",
 ]
 
 from .camel_case_to_snake_case import camel_case_to_snake_case
+from .frozen_slots import FrozenSlots
+from .ttl_cache import TTLCache, MISSING
+from .metrics import MetricsRegistry
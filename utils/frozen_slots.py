@@ -0,0 +1,20 @@
+# utils/frozen_slots.py
+
+"""
+Base class for small immutable value objects built on __slots__.
+Used for compiled catalogs shared between all bot users, so nobody can mutate them by accident.
+"""
+
+
+class FrozenSlots:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")